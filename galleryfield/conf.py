@@ -15,12 +15,15 @@ DJANGO_GALLERY_FIELD_CONFIG = {
     },
     "thumbnails": {
         "size": 120,
-        "quality": 80
+        "quality": 80,
+        "workers": 1
     },
     "jquery_file_upload_ui_options": {}
     "jquery_file_upload_ui_sortable_options": {}
     "widget_hidden_input_css_class": "django-galleryfield",
     "prompt_alert_if_changed_on_window_reload": True,
+    "server_side_crop_workers": 0,
+    "image_data_cache_timeout": 0,
 }
 """
 
@@ -45,6 +48,8 @@ DEFAULT_THUMBNAIL_SIZE = get_formatted_thumbnail_size(
         "size", defaults.DEFAULT_THUMBNAIL_SIZE))
 DEFAULT_THUMBNAIL_QUALITY = int(_APP_CONFIG_THUMBNAILS.get(
     "quality", defaults.DEFAULT_THUMBNAIL_QUALITY))
+THUMBNAIL_WORKERS = int(_APP_CONFIG_THUMBNAILS.get(
+    "workers", defaults.DEFAULT_THUMBNAIL_WORKERS))
 
 
 _APP_CONFIG_WIDGET_INPUT_CSS_CLASS = _APP_CONFIG.get(
@@ -67,6 +72,15 @@ JQUERY_FILE_UPLOAD_UI_DEFAULT_SORTABLE_OPTIONS = _APP_CONFIG.get(
     defaults.JQUERY_FILE_UPLOAD_UI_DEFAULT_SORTABLE_OPTIONS
 )
 
+SERVER_SIDE_CROP_WORKERS = int(_APP_CONFIG.get(
+    "server_side_crop_workers", defaults.SERVER_SIDE_CROP_WORKERS))
+
+SERVER_SIDE_CROP_TIMEOUT = _APP_CONFIG.get(
+    "server_side_crop_timeout", defaults.SERVER_SIDE_CROP_TIMEOUT)
+
+IMAGE_DATA_CACHE_TIMEOUT = _APP_CONFIG.get(
+    "image_data_cache_timeout", defaults.IMAGE_DATA_CACHE_TIMEOUT)
+
 BOOTSTRAP_VERSION = _APP_CONFIG.get(
     "bootstrap_version", defaults.DEFAULT_BOOTSTRAP_VERSION)
 
@@ -0,0 +1,148 @@
+"""Server side cropping of images.
+
+The functions in this module don't depend on Django, so that they can be
+run in worker processes (see ``server_side_crop_workers`` in
+``DJANGO_GALLERY_FIELD_CONFIG``).
+"""
+
+import math
+from io import BytesIO
+
+from PIL import Image
+
+try:
+    import pyvips
+except (ImportError, OSError):  # pragma: no cover
+    # OSError is raised by pyvips if libvips is not installed.
+    pyvips = None
+
+# Encoder options of the cropped images, in line with VIPS_CROP_SAVE_OPTIONS.
+PILLOW_CROP_SAVE_OPTIONS = {
+    "JPEG": {"quality": 90, "optimize": False, "progressive": False},
+}
+
+# Formats which libvips can both load and save without ImageMagick,
+# mapped to the save suffix and the mimetype of the cropped result.
+VIPS_CROP_SAVE_OPTIONS = {
+    "jpegload": (".jpg[Q=90,optimize_coding,strip]", "image/jpeg"),
+    "pngload": (".png", "image/png"),
+    "webpload": (".webp", "image/webp"),
+}
+
+
+class CropError(Exception):
+    pass
+
+
+def get_rotate_crop_affine_data(size, rotate, x, y):
+    """Get the data of :attr:`PIL.Image.AFFINE` transform, which maps the
+    result of ``image.rotate(-rotate, expand=True).crop((x, y, ...))`` to
+    the pixels of the source image with ``size``.
+    """
+    # This follows what PIL.Image.Image.rotate does with expand=True.
+    w, h = size
+    angle = math.radians(rotate)
+    a = e = round(math.cos(angle), 15)
+    b = round(math.sin(angle), 15)
+    d = -b
+
+    def transform(_x, _y):
+        return a * _x + b * _y, d * _x + e * _y
+
+    # Rotating around the center of the source image
+    c, f = transform(-w / 2, -h / 2)
+    c, f = c + w / 2, f + h / 2
+
+    # The size of the expanded image after rotation
+    corners = [transform(_x, _y) for _x, _y in ((0, 0), (w, 0), (w, h), (0, h))]
+    xx = [_x + c for _x, _ in corners]
+    yy = [_y + f for _, _y in corners]
+    expanded_w = math.ceil(max(xx)) - math.floor(min(xx))
+    expanded_h = math.ceil(max(yy)) - math.floor(min(yy))
+
+    # Translating to the expanded image, and then to the crop box
+    offset_x, offset_y = transform(
+        x - (expanded_w - w) / 2, y - (expanded_h - h) / 2)
+    return a, b, c + offset_x, d, e, f + offset_y
+
+
+def crop_image_with_vips(path, x, y, width, height, rotate):
+    """Crop (and rotate) the image at ``path`` with libvips.
+
+    :return: a tuple of ``(content, content_type)``, or ``None`` if ``pyvips``
+      is not installed or the image can't be handled by libvips, in which case
+      the caller should fall back to Pillow.
+    """
+    if pyvips is None:
+        return None
+
+    try:
+        # Rotating needs random access to the whole image, while a plain
+        # crop can be streamed through the (SIMD accelerated) decoder.
+        image = pyvips.Image.new_from_file(
+            path, access="sequential" if rotate == 0 else "random")
+
+        save_options = VIPS_CROP_SAVE_OPTIONS.get(image.get("vips-loader"))
+        if save_options is None:
+            return None
+        suffix, content_type = save_options
+
+        if rotate % 90 == 0:
+            # cropperjs rotates clockwise, so does vips "rot".
+            if rotate % 360:
+                image = image.rot(f"d{rotate % 360}")
+        else:
+            image = image.rotate(rotate)
+
+        image = image.crop(x, y, width, height)
+        return image.write_to_buffer(suffix), content_type
+    except pyvips.Error:
+        return None
+
+
+def crop_image_with_pillow(path, x, y, width, height, rotate, output):
+    """Crop (and rotate) the image at ``path`` with Pillow, and save the
+    result to the file object ``output``.
+
+    :return: the content type of the result.
+    :raises CropError: if the image can't be opened.
+    """
+    try:
+        image = Image.open(path)
+    except IOError as e:
+        raise CropError(str(e))
+
+    image_format = image.format
+
+    if rotate != 0:
+        # Rotating and cropping in one pass, rather than allocating
+        # the whole rotated (and expanded) image and then cropping it.
+        image = image.transform(
+            (width, height), Image.AFFINE,
+            get_rotate_crop_affine_data(image.size, rotate, x, y),
+            resample=Image.NEAREST)
+    else:
+        box = (x, y, x + width, y + height)
+        image = image.crop(box)
+
+    image.save(
+        output, format=image_format,
+        **PILLOW_CROP_SAVE_OPTIONS.get(image_format, {}))
+
+    return Image.MIME[image_format]
+
+
+def crop_image(path, x, y, width, height, rotate):
+    """Crop (and rotate) the image at ``path``, with libvips if possible.
+
+    :return: a tuple of ``(content, content_type)``.
+    :raises CropError: if the image can't be opened.
+    """
+    result = crop_image_with_vips(path, x, y, width, height, rotate)
+    if result is not None:
+        return result
+
+    output = BytesIO()
+    content_type = crop_image_with_pillow(
+        path, x, y, width, height, rotate, output)
+    return output.getvalue(), content_type
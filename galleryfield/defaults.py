@@ -58,6 +58,13 @@ EXTRA_CSS = []
 
 DEFAULT_THUMBNAIL_SIZE = "120x120"
 DEFAULT_THUMBNAIL_QUALITY = 80
+DEFAULT_THUMBNAIL_WORKERS = 1
+
+SERVER_SIDE_CROP_WORKERS = 0
+
+SERVER_SIDE_CROP_TIMEOUT = 60
+
+IMAGE_DATA_CACHE_TIMEOUT = 0
 
 WIDGET_HIDDEN_INPUT_CSS_CLASS = "django-galleryfield"
 
@@ -1,25 +1,49 @@
 from django import forms
 from django.core.exceptions import ImproperlyConfigured, ValidationError
 from django.core.validators import BaseValidator
-from django.db import models
+from django.db import connections, models
 from django.db.models import Case, IntegerField, Value, When
+from django.db.models.query import ModelIterable
 from django.db.models.query_utils import DeferredAttribute
 from django.utils.deconstruct import deconstructible
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
-from django.utils.translation import ngettext_lazy
 
 from galleryfield import conf
 from galleryfield import defaults as _defaults
 from galleryfield.utils import apps, get_or_check_image_field, logger
 from galleryfield.widgets import GalleryWidget
 
+# The image fields of target models, which don't change once the apps
+# are ready, see get_target_model_image_field.
+_target_model_image_fields = {}
+
+
+def get_target_model_image_field(target_model):
+    """Get the image field of ``target_model`` (a model label, or ``None``
+    for the default target model), or ``None`` if it can't be resolved yet.
+    Resolved fields are cached, so that the many instances of model fields
+    created by migrations, checks and deconstruct don't resolve them again.
+    """
+    cacheable = target_model is None or isinstance(target_model, str)
+    if cacheable and target_model in _target_model_image_fields:
+        return _target_model_image_fields[target_model]
+
+    image_field = get_or_check_image_field(
+        obj=None,
+        target_model=target_model,
+        check_id_prefix="gallery_field",
+        is_checking=False)
+
+    # Not cached when the apps are not ready yet
+    if cacheable and image_field is not None:
+        _target_model_image_fields[target_model] = image_field
+    return image_field
+
 
 @deconstructible
 class MaxNumberOfImageValidator(BaseValidator):
-    message = ngettext_lazy(
-        'Number of images exceeded, only %(limit_value)d allowed',
-        'Number of images exceeded, only %(limit_value)d allowed',
-        'limit_value')
+    message = _('Number of images exceeded, only %(limit_value)d allowed')
     code = 'max_number_of_images'
 
     def compare(self, a, b):
@@ -29,6 +53,14 @@ class MaxNumberOfImageValidator(BaseValidator):
         return len(x)
 
 
+class RawJSON(str):
+    """A JSON string which is already serialized (e.g., the data submitted
+    by the widget), which should be passed through as is, rather than
+    being parsed and then serialized again.
+    """
+    __slots__ = ()
+
+
 class GalleryDescriptor(DeferredAttribute):
     """
     A collections of pks of image model instances
@@ -40,6 +72,11 @@ class GalleryDescriptor(DeferredAttribute):
         instance.__dict__[self.field.attname] = value
 
     def __get__(self, instance, cls=None):
+        if instance is not None:
+            image_list = instance.__dict__.get(self.field.attname)
+            if isinstance(image_list, GalleryImages):
+                return image_list
+
         image_list = super().__get__(instance, cls)
 
         if not isinstance(image_list, GalleryImages):
@@ -49,27 +86,106 @@ class GalleryDescriptor(DeferredAttribute):
         return instance.__dict__[self.field.name]
 
 
+def order_by_pks(queryset, pks):
+    # Preserving the order of image using id__in=pks
+    # https://stackoverflow.com/a/37146498/3437454
+    cases = [When(pk=pk, then=Value(i)) for i, pk in enumerate(pks)]
+    return queryset.order_by(Case(*cases, output_field=IntegerField()))
+
+
+class GalleryImagesQuerySet(models.QuerySet):
+    """The queryset of :attr:`GalleryImages.objects`, which is in the
+    order of the pks saved in the field, unless ordered by :meth:`order_by`.
+
+    The images are sorted in Python after they are fetched, rather than
+    ordered by a ``Case`` expression with a ``When`` for each pk. The
+    expression is only used when the order is needed by the SQL, e.g.,
+    when the queryset is sliced.
+    """
+
+    _gallery_pks = None
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._gallery_pks = self._gallery_pks
+        return clone
+
+    def _order_by_gallery_pks(self):
+        return order_by_pks(self, self._gallery_pks)
+
+    @property
+    def ordered(self):
+        return self._gallery_pks is not None or super().ordered
+
+    def order_by(self, *field_names):
+        clone = super().order_by(*field_names)
+        clone._gallery_pks = None
+        return clone
+
+    def __getitem__(self, k):
+        if self._gallery_pks is not None and self._result_cache is None:
+            return self._order_by_gallery_pks()[k]
+        return super().__getitem__(k)
+
+    def iterator(self, *args, **kwargs):
+        if self._gallery_pks is not None:
+            return self._order_by_gallery_pks().iterator(*args, **kwargs)
+        return super().iterator(*args, **kwargs)
+
+    def _fetch_all(self):
+        if self._gallery_pks is not None and self._result_cache is None:
+            if issubclass(self._iterable_class, ModelIterable):
+                order = {}
+                for i, pk in enumerate(self._gallery_pks):
+                    order.setdefault(pk, i)
+                # reverse() flips standard_ordering, as it does for the
+                # ordering of the SQL.
+                self._result_cache = sorted(
+                    self._iterable_class(self),
+                    key=lambda obj: order.get(obj.pk, len(order)),
+                    reverse=not self.query.standard_ordering)
+            else:
+                # e.g., values_list(), of which the rows might not contain pk
+                self._result_cache = list(
+                    self._iterable_class(self._order_by_gallery_pks()))
+        super()._fetch_all()
+
+
 class GalleryImages(list):
+    # An instance is created for each model instance accessing the field.
+    __slots__ = ("_field", "instance")
+
     def __init__(self, instance, field, field_value):
         # When field_value is None,
         # (This happens when the GalleryField was saved as null)
-        field_value = field_value or []
-        super().__init__(field_value)
+        super().__init__(field_value or ())
         self._field = field
         self.instance = instance
-        self._value = field_value or []
 
     @property
     def objects(self):
-        model = apps.get_model(self._field.target_model)
-
-        # Preserving the order of image using id__in=pks
-        # https://stackoverflow.com/a/37146498/3437454
-        cases = [When(id=x, then=Value(i)) for i, x in enumerate(self._value)]
-        case = Case(*cases, output_field=IntegerField())
-        filter_kwargs = {"id__in": self._value}
-        queryset = model.objects.filter(**filter_kwargs)
-        queryset = queryset.annotate(_order=case).order_by('_order')
+        model = self._field._resolved_model
+        if not self:
+            return model.objects.none()
+
+        # The pks are read from the list itself, so that the images
+        # appended or removed after loading are also reflected.
+        pks = [int(pk) for pk in self]
+        queryset = model.objects.filter(pk__in=pks)
+
+        if type(queryset) is models.QuerySet:
+            queryset = GalleryImagesQuerySet(
+                model=model, query=queryset.query, using=queryset._db,
+                hints=queryset._hints)
+            queryset._gallery_pks = pks
+        else:
+            # Custom queryset classes of the model manager are kept.
+            queryset = order_by_pks(queryset, pks)
+
+        if self._field.select_related:
+            queryset = queryset.select_related(*self._field.select_related)
+        if self._field.prefetch_related:
+            queryset = queryset.prefetch_related(*self._field.prefetch_related)
         return queryset
 
 
@@ -84,6 +200,16 @@ class GalleryField(models.JSONField):
 
     :type target_model: str, optional.
 
+    :param select_related: Related fields of ``target_model`` which will be
+           passed to :meth:`select_related` of :attr:`GalleryImages.objects`,
+           defaults to `None`.
+    :type select_related: str, or list or tuple of str, optional.
+
+    :param prefetch_related: Lookups which will be passed to
+           :meth:`prefetch_related` of :attr:`GalleryImages.objects`,
+           defaults to `None`.
+    :type prefetch_related: str, or list or tuple of str, optional.
+
     """  # noqa
 
     attr_class = GalleryImages
@@ -93,18 +219,36 @@ class GalleryField(models.JSONField):
 
     def contribute_to_class(self, cls, name, private_only=False):
         super().contribute_to_class(cls, name, private_only)
-        setattr(cls, self.attname, self.descriptor_class(self))
 
-    def __init__(self, target_model=None, *args, **kwargs):
+        # The descriptor might have been installed by Django already.
+        descriptor = cls.__dict__.get(self.attname)
+        if not (isinstance(descriptor, self.descriptor_class)
+                and descriptor.field is self):
+            setattr(cls, self.attname, self.descriptor_class(self))
+
+    def __init__(self, target_model=None, *args, select_related=None,
+                 prefetch_related=None, **kwargs):
         self._init_target_model = self.target_model = target_model
         if target_model is None:
             self.target_model = _defaults.DEFAULT_TARGET_IMAGE_MODEL
 
+        # A single lookup might be passed as a str.
+        if isinstance(select_related, str):
+            select_related = (select_related,)
+        if isinstance(prefetch_related, str):
+            prefetch_related = (prefetch_related,)
+        self.select_related = tuple(select_related or ())
+        self.prefetch_related = tuple(prefetch_related or ())
+
         self.target_model_image_field = (
-            self._get_image_field_or_test(is_checking=False))
+            get_target_model_image_field(self._init_target_model))
 
         super().__init__(*args, **kwargs)
 
+    @cached_property
+    def _resolved_model(self):
+        return apps.get_model(self.target_model)
+
     def _get_image_field_or_test(self, is_checking=False):
         return get_or_check_image_field(
             obj=self,
@@ -123,6 +267,10 @@ class GalleryField(models.JSONField):
     def deconstruct(self):
         name, path, args, kwargs = super().deconstruct()
         kwargs['target_model'] = self.target_model
+        if self.select_related:
+            kwargs['select_related'] = self.select_related
+        if self.prefetch_related:
+            kwargs['prefetch_related'] = self.prefetch_related
         return name, path, args, kwargs
 
     def formfield(self, **kwargs):
@@ -209,11 +357,39 @@ class GalleryFormField(forms.JSONField):
         self._widget_is_servicing = (
                 kwargs.pop("model_field", None) or self.__class__.__name__)
 
+        # The default URL names of the widget, which are assigned when
+        # the widget didn't specify them.
+        target_app_model_name = "-".join(self._image_model.split(".")).lower()
+
+        # Here we required a target_model should have a upload_url
+        # name in url_conf in the form of app_label_model_name-upload
+        # in lower case
+        self._upload_url_name = f"{target_app_model_name}-upload"
+
+        # Here we required a target_model should have a fetch_url
+        # name in url_conf in the form of app_label-model_name-fetch
+        # in lower case
+        self._fetch_url_name = f"{target_app_model_name}-fetch"
+
         self._max_number_of_images = max_number_of_images
+
+        # The submitted string and the pks converted from it in the last
+        # call of to_python, see to_python.
+        self._last_converted = None
+
         super().__init__(**kwargs)
 
+    def __deepcopy__(self, memo):
+        result = super().__deepcopy__(memo)
+        result._last_converted = None
+        return result
+
     _widget = GalleryWidget
 
+    @cached_property
+    def _resolved_model(self):
+        return apps.get_model(self._image_model)
+
     @property
     def widget(self):
         return self._widget
@@ -242,29 +418,17 @@ class GalleryFormField(forms.JSONField):
         self._set_widget_upload_url()
         self._set_widget_fetch_url()
 
-    @property
-    def _target_app_model_name(self):
-        return "-".join(self._image_model.split(".")).lower()
-
     def _set_widget_upload_url(self):
         if self.widget.upload_url:
             return
 
-        # Here we required a target_model should have a upload_url
-        # name in url_conf in the form of app_label_model_name-upload
-        # in lower case
-        self.widget.upload_url = (
-                "{}-upload".format(self._target_app_model_name.lower()))
+        self.widget.upload_url = self._upload_url_name
 
     def _set_widget_fetch_url(self):
         if self.widget.disable_fetch or self.widget.fetch_url:
             return
 
-        # Here we required a target_model should have a fetch_url
-        # name in url_conf in the form of app_label-model_name-fetch
-        # in lower case
-        self.widget.fetch_url = (
-                "{}-fetch".format(self._target_app_model_name.lower()))
+        self.widget.fetch_url = self._fetch_url_name
 
     @property
     def max_number_of_images(self):
@@ -281,9 +445,12 @@ class GalleryFormField(forms.JSONField):
         self._max_number_of_images = value
         self._widget.max_number_of_images = value
 
+        # Replacing the validator added by previous assignment, if any.
+        self.validators = [
+            v for v in self.validators
+            if not isinstance(v, MaxNumberOfImageValidator)]
         if value:
-            self.validators.append(
-                MaxNumberOfImageValidator(int(value)))
+            self.validators.append(MaxNumberOfImageValidator(value))
 
     def widget_attrs(self, widget):
         # If BootStrap is loaded, "hiddeninput" is added by BootStrap.
@@ -294,12 +461,51 @@ class GalleryFormField(forms.JSONField):
                 [conf.FILES_FIELD_CLASS_NAME, "hiddeninput"])
         }
 
+    def bound_data(self, data, initial):
+        if self.disabled or not isinstance(data, str):
+            return super().bound_data(data, initial)
+
+        # The submitted data will only be rendered back to the widget,
+        # so there's no need to decode it here and encode it again in
+        # prepare_value.
+        return RawJSON(data)
+
+    def prepare_value(self, value):
+        if isinstance(value, RawJSON):
+            return value
+        return super().prepare_value(value)
+
+    def clean(self, value):
+        # The field might not be bound to a form (or the form might be
+        # cleaned again), pks are always checked against the database
+        # when cleaning.
+        self._last_converted = None
+        return super().clean(value)
+
     def to_python(self, value):
+        if value == "[]" and not self.disabled:
+            # The widget submits an empty list when no image was uploaded,
+            # which is common for create forms.
+            return []
+
+        # to_python is called by both clean() and has_changed() (twice) of
+        # a bound form, the pks validated in clean() are reused by
+        # has_changed() of the same form.
+        if (isinstance(value, str) and self._last_converted is not None
+                and self._last_converted[0] == value):
+            return list(self._last_converted[1])
+
         converted = super().to_python(value)
 
         if converted in self.empty_values:
             return converted
 
+        converted = self._validate_pks(converted)
+        if isinstance(value, str):
+            self._last_converted = (value, list(converted))
+        return converted
+
+    def _validate_pks(self, converted):
         # Make sure the json is a list of pks
         if not isinstance(converted, list):
             raise ValidationError(
@@ -308,23 +514,38 @@ class GalleryFormField(forms.JSONField):
                 params={'value': converted},
             )
 
-        for _pk in converted:
-            if not str(_pk).isdigit():
+        if set(map(type, converted)) == {int} and min(converted) >= 0:
+            # A list of ints (e.g., submitted by the widget) is validated
+            # as a whole, without checking the items one by one.
+            int_pks = converted
+        else:
+            int_pks = []
+            for _pk in converted:
+                if isinstance(_pk, int) and not isinstance(_pk, bool):
+                    if _pk >= 0:
+                        int_pks.append(_pk)
+                        continue
+                elif isinstance(_pk, str) and _pk.isdecimal():
+                    int_pks.append(int(_pk))
+                    continue
                 raise ValidationError(
                     self.error_messages['invalid'],
                     code='invalid',
                     params={'value': converted},
                 )
 
-        # Make sure all pks exists
-        image_model = apps.get_model(self._image_model)
-        if (image_model.objects.filter(
-                pk__in=list(map(int, converted))).count()
-                != len(converted)):
-            converted_copy = converted[:]
-            converted = []
-            for pk in converted_copy:
-                if image_model.objects.filter(pk=pk).count():
-                    converted.append(pk)
-
-        return converted
+        # Make sure all pks exists, with a single query unless the number
+        # of pks exceeds the limit of query parameters of the database.
+        unique_pks = list(dict.fromkeys(int_pks))
+        queryset = self._resolved_model.objects.values_list("pk", flat=True)
+        batch_size = (
+                connections[queryset.db].features.max_query_params
+                or len(unique_pks))
+        existing = set()
+        for i in range(0, len(unique_pks), batch_size):
+            existing.update(
+                queryset.filter(pk__in=unique_pks[i:i + batch_size]))
+        if len(existing) == len(unique_pks):
+            return int_pks
+
+        return [pk for pk in int_pks if pk in existing]
@@ -1,28 +1,49 @@
+import hashlib
 import json
 import mimetypes
+import multiprocessing
 import os
-from io import BytesIO
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from io import BytesIO, UnsupportedOperation
+from operator import itemgetter
+from tempfile import SpooledTemporaryFile
 from urllib.parse import unquote
 
 from django import forms
 from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import (ImproperlyConfigured, PermissionDenied,
                                     SuspiciousOperation)
 from django.core.files.uploadedfile import InMemoryUploadedFile
 from django.core.serializers.json import DjangoJSONEncoder
-from django.db.models import Case, When
-from django.http import JsonResponse
-from django.urls import reverse
-from django.utils.translation import gettext
+from django.db import connections
+from django.http import HttpResponse, JsonResponse
+from django.urls import get_script_prefix, get_urlconf, reverse
+from django.utils.translation import get_language, gettext
 from django.views.generic import UpdateView
 from django.views.generic.list import BaseListView
-from PIL import Image
 from sorl.thumbnail import get_thumbnail
 
 from galleryfield import conf, defaults
+from galleryfield.crop import (CropError, crop_image, crop_image_with_pillow,
+                               crop_image_with_vips)
 from galleryfield.utils import (get_formatted_thumbnail_size,
                                 get_or_check_image_field)
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# Request data are parsed with orjson when it's installed.
+json_loads = orjson.loads if orjson is not None else json.loads
+
 # cropping gif not supported by cropperjs
 # https://github.com/fengyuanchen/cropperjs/issues/756
 # cropping tiff were only supported on safari
@@ -37,12 +58,100 @@ ALLOWED_CROP_MIMETYPES = (
 )
 
 
+# Methods of the image model which might access fields other than the
+# image field when serializing an image instance.
+MODEL_SERIALIZATION_METHODS = ("get_image_url", "get_crop_url", "serialize_extra")
+
+# A json list of non-negative integers (or strings of them), e.g.,
+# '[1, 2, 3]' or '["1", "2"]'.
+PKS_PATTERN = re.compile(
+    r'\[\s*(?:"?\d+"?(?:\s*,\s*"?\d+"?)*)?\s*\]', re.ASCII)
+
+# A pk which is used to build the crop URL template of a view,
+# see BaseImageModelMixin.validate_crop_url.
+CROP_URL_PK_PLACEHOLDER = 1234567890987654321
+
+# Shared by all views, so that the encoder is not re-instantiated per response.
+JSON_RESPONSE_ENCODER = DjangoJSONEncoder(separators=(",", ":"))
+
+if orjson is not None:
+    # Datetimes are passed to DjangoJSONEncoder.default, so that they are
+    # serialized the same as by JSON_RESPONSE_ENCODER. So are subclasses of
+    # builtin types, e.g., ErrorList of form errors, which keeps its items
+    # in a separate attribute.
+    ORJSON_DUMPS_OPTION = (
+        orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_SUBCLASS)
+
+
+def _orjson_default(obj):
+    for builtin_type in (str, int, dict, list):
+        if isinstance(obj, builtin_type):
+            return builtin_type(obj)
+    return JSON_RESPONSE_ENCODER.default(obj)
+
+
+def json_dumps(obj):
+    """Serialize ``obj`` to compact JSON as :data:`JSON_RESPONSE_ENCODER`
+    does, with orjson when it's installed.
+
+    :return: bytes if serialized by orjson, else str.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(
+                obj, default=_orjson_default, option=ORJSON_DUMPS_OPTION)
+        except orjson.JSONEncodeError:
+            # e.g., integers which exceed 64 bits
+            pass
+    return JSON_RESPONSE_ENCODER.encode(obj)
+
+
 def is_image_file_cropable(image_file):
     # Python mimetypes doesn't support image/webp until 3.10
     # https://github.com/python/cpython/issues/83083
     return (
-            mimetypes.guess_type(image_file.path)[0] in ALLOWED_CROP_MIMETYPES
-            or os.path.splitext(image_file.path)[1] in [".webp"])
+            mimetypes.guess_type(image_file.name)[0] in ALLOWED_CROP_MIMETYPES
+            or os.path.splitext(image_file.name)[1] in [".webp"])
+
+
+# Target models and URL confs don't change at runtime, so the following
+# lookups done in the setup of each request of the views are cached.
+
+@lru_cache(maxsize=None)
+def get_image_model_and_field_name(target_model):
+    image_field_name = get_or_check_image_field(
+        obj=None, target_model=target_model,
+        check_id_prefix="", is_checking=False).name
+    return apps.get_model(target_model), image_field_name
+
+
+@lru_cache(maxsize=None)
+def get_crop_url_parts(crop_url_name, urlconf, script_prefix, language):
+    """Validate ``crop_url_name`` by reversing it, raising an exception
+    if it's invalid.
+
+    The URL reversed depends on ``urlconf``, ``script_prefix`` and the active
+    ``language`` (e.g., with ``i18n_patterns``), they are passed to key the
+    cache.
+
+    :return: the crop URL split by the pk, or ``None`` if the URL can't be
+      built that way.
+    """
+    reverse(crop_url_name, kwargs={"pk": 1}, urlconf=urlconf)
+
+    try:
+        url = reverse(
+            crop_url_name, kwargs={"pk": CROP_URL_PK_PLACEHOLDER},
+            urlconf=urlconf)
+    except Exception:
+        # e.g., the URL pattern doesn't accept such a pk
+        return None
+
+    parts = url.split(str(CROP_URL_PK_PLACEHOLDER))
+    if len(parts) != 2:
+        return None
+    return tuple(parts)
 
 
 class BaseImageModelMixin:
@@ -63,6 +172,14 @@ class BaseImageModelMixin:
     crop_url_name = None
     disable_server_side_crop = True
 
+    # The crop URL split by the pk, so that building the crop URLs of
+    # a list of images doesn't need a reverse() call for each of them.
+    _crop_url_parts = None
+
+    # The default image data fetched from cache in bulk by list views,
+    # keyed by cache keys.
+    _prefetched_image_data = None
+
     def setup(self, request, *args, **kwargs):
         # XML request only check
         if request.META.get('HTTP_X_REQUESTED_WITH') != 'XMLHttpRequest':
@@ -82,11 +199,8 @@ class BaseImageModelMixin:
                 "the 'target_model' attribute is prohibited."
             )
 
-        self._image_field_name = (get_or_check_image_field(
-            obj=self, target_model=self.target_model,
-            check_id_prefix=self.__class__.__name__,
-            is_checking=False).name)
-        self.model = apps.get_model(self.target_model)
+        self.model, self._image_field_name = (
+            get_image_model_and_field_name(self.target_model))
 
         self._model_crop_url_method_exists = False
         model_crop_url_method = getattr(self.model, "get_crop_url", None)
@@ -97,7 +211,13 @@ class BaseImageModelMixin:
             else:
                 self._model_crop_url_method_exists = True
 
+        self._image_data_cache_keys = {}
+        self._image_stats = {}
+
     def get_default_crop_url(self, pk):
+        if self._crop_url_parts is not None and isinstance(pk, int):
+            prefix, suffix = self._crop_url_parts
+            return f"{prefix}{pk}{suffix}"
         return reverse(self.crop_url_name, kwargs={"pk": pk})
 
     def _get_crop_url(self, obj):
@@ -129,7 +249,9 @@ class BaseImageModelMixin:
             app_model_name = "-".join(self.target_model.split(".")).lower()
             self.crop_url_name = f"{app_model_name}-crop"
         try:
-            self.get_default_crop_url(pk=1)
+            crop_url_parts = get_crop_url_parts(
+                self.crop_url_name, get_urlconf() or settings.ROOT_URLCONF,
+                get_script_prefix(), get_language())
         except Exception as e:
             raise ImproperlyConfigured(
                 f"'crop_url_name' in {self.__class__.__name__} is invalid. "
@@ -144,6 +266,8 @@ class BaseImageModelMixin:
                     "are handling different image models. This is prohibited."
             )
 
+        self._crop_url_parts = crop_url_parts
+
     def get_and_validate_thumbnail_size_from_request(self):
         # Get preview size from request
         method = self.request.method.lower()
@@ -182,14 +306,84 @@ class BaseImageModelMixin:
             crop="center",
             quality=conf.DEFAULT_THUMBNAIL_QUALITY)
 
+    def _get_thumbnail_url(self, obj, image):
+        future = getattr(self, "_thumbnail_futures", {}).get(obj.pk)
+        if future is not None:
+            return future.result().url
+        return self.get_thumbnail(image).url
+
+    def get_image_data_cache_key(self, obj):
+        """Return the key used to cache the default data of ``obj``, or
+        ``None`` if that data should not be cached. The key changes when
+        the image file is modified.
+        """
+        if conf.IMAGE_DATA_CACHE_TIMEOUT == 0:
+            return None
+
+        # The data generated by those model methods might be
+        # varied by request.
+        if (self._model_crop_url_method_exists
+                or hasattr(self.model, "get_image_url")):
+            return None
+
+        image_stat = self._stat_image_file(obj)
+        if image_stat is None:
+            return None
+
+        # The data might also be varied by the view class (e.g., overridden
+        # methods) and the active language (e.g., the reversed crop url).
+        # Hashed to keep the key within the length limit of memcached.
+        return "galleryfield-image-data:" + hashlib.sha1(":".join([
+            f"{type(self).__module__}.{type(self).__qualname__}",
+            get_language() or "", self.model._meta.label_lower,
+            str(obj.pk), str(image_stat.st_mtime_ns), self.thumbnail_size,
+            "" if self.disable_server_side_crop else self.crop_url_name
+        ]).encode()).hexdigest()
+
+    def _stat_image_file(self, obj):
+        if obj.pk not in self._image_stats:
+            try:
+                self._image_stats[obj.pk] = os.stat(
+                    getattr(obj, self._image_field_name).path)
+            except (NotImplementedError, OSError):
+                # The storage doesn't support local file path, or the file
+                # was deleted.
+                self._image_stats[obj.pk] = None
+        return self._image_stats[obj.pk]
+
+    def _get_image_data_cache_key(self, obj):
+        if obj.pk not in self._image_data_cache_keys:
+            self._image_data_cache_keys[obj.pk] = (
+                self.get_image_data_cache_key(obj))
+        return self._image_data_cache_keys[obj.pk]
+
     def get_default_image_data(self, obj):
         # This is used to construct return value file dict in
         # upload list and crop views.
+        cache_key = self._get_image_data_cache_key(obj)
+        if cache_key is not None:
+            if self._prefetched_image_data is not None:
+                image_data = self._prefetched_image_data.get(cache_key)
+            else:
+                image_data = cache.get(cache_key)
+            if image_data is not None:
+                return dict(image_data), []
+
+        image_data, errors = self._get_default_image_data(obj)
+
+        if cache_key is not None and not errors:
+            cache.set(cache_key, image_data, conf.IMAGE_DATA_CACHE_TIMEOUT)
+
+        return image_data, errors
+
+    def _get_default_image_data(self, obj):
         image = getattr(obj, self._image_field_name)
 
         image_data = {
             'pk': obj.pk,
-            'name': os.path.basename(image.path),
+            # Names in storages are always separated by "/", and unlike
+            # image.path, they are available for remote storages.
+            'name': image.name.rsplit("/", 1)[-1],
         }
 
         errors = []
@@ -209,8 +403,12 @@ class BaseImageModelMixin:
                     gettext("crop url: %s: %s" % (type(e).__name__, str(e)))
                 )
 
+        # Reusing the stat of the image file if it was done in building
+        # the cache key, rather than requesting the storage again.
+        image_stat = self._image_stats.get(obj.pk)
         try:
-            image_size = image.size
+            image_size = (
+                image_stat.st_size if image_stat is not None else image.size)
         except OSError:
             errors.append(gettext(
                 "image: The image was unexpectedly deleted from server"))
@@ -220,7 +418,7 @@ class BaseImageModelMixin:
             })
 
         try:
-            image_data['thumbnailUrl'] = self.get_thumbnail(image).url
+            image_data['thumbnailUrl'] = self._get_thumbnail_url(obj, image)
         except Exception as e:
             errors.append(
                 gettext("thumbnail: %s: %s" % (type(e).__name__, str(e)))
@@ -272,11 +470,18 @@ class BaseImageModelMixin:
     def render_to_response(self, context, **response_kwargs):
         # Overriding the method from template view, we don't need
         # a template in rendering the JsonResponse
-        encoder = response_kwargs.pop("encoder", DjangoJSONEncoder)
+        encoder = response_kwargs.pop("encoder", None)
         safe = response_kwargs.pop("safe", True)
         json_dumps_params = response_kwargs.pop("json_dumps_params", None)
+
+        if (encoder is None and json_dumps_params is None
+                and isinstance(context, dict)):
+            response_kwargs.setdefault("content_type", "application/json")
+            return HttpResponse(json_dumps(context), **response_kwargs)
+
         return JsonResponse(
-            context, encoder, safe, json_dumps_params, **response_kwargs)
+            context, encoder or DjangoJSONEncoder, safe, json_dumps_params,
+            **response_kwargs)
 
 
 class ImageFormViewMixin:
@@ -299,6 +504,50 @@ class ImageFormViewMixin:
         return context
 
 
+# The form classes below are built once per image model and image field,
+# rather than in each request.
+
+@lru_cache(maxsize=64)
+def get_image_create_form_class(image_model, image_field_name):
+    # Here we were simulating the request is done through
+    # a form. In this way, we can used ImageField to validate
+    # the file.
+
+    class ImageForm(forms.ModelForm):
+        class Meta:
+            model = image_model
+            fields = (image_field_name,)
+
+        def __init__(self, files=None, **kwargs):
+            if files is not None:
+                # When getting data from ajax post
+                files = {image_field_name: files["files[]"]}
+            return super().__init__(files=files, **kwargs)
+
+    return ImageForm
+
+
+@lru_cache(maxsize=64)
+def get_image_crop_form_class(image_model, image_field_name):
+    # Here we were simulating the request is done through
+    # a form. In this way, we can used ImageField to validate
+    # the file.
+
+    class ImageForm(forms.ModelForm):
+        class Meta:
+            model = image_model
+            fields = (image_field_name,)
+
+        def __init__(self, get_cropped_uploaded_file, **kwargs):
+            super().__init__(**kwargs)
+
+            new_uploaded_file = get_cropped_uploaded_file(self.instance)
+            self.instance.pk = None
+            self.initial = {image_field_name: new_uploaded_file}
+
+    return ImageForm
+
+
 class BaseCreateMixin(ImageFormViewMixin, BaseImageModelMixin):
     http_method_names = ['post']
 
@@ -306,24 +555,7 @@ class BaseCreateMixin(ImageFormViewMixin, BaseImageModelMixin):
         super().setup(request, *args, **kwargs)
 
     def get_form_class(self):
-        # Here we were simulating the request is done through
-        # a form. In this way, we can used ImageField to validate
-        # the file.
-
-        this = self
-
-        class ImageForm(forms.ModelForm):
-            class Meta:
-                model = this.model
-                fields = (this._image_field_name,)
-
-            def __init__(self, files=None, **kwargs):
-                if files is not None:
-                    # When getting data from ajax post
-                    files = {this._image_field_name: files["files[]"]}
-                return super().__init__(files=files, **kwargs)
-
-        return ImageForm
+        return get_image_create_form_class(self.model, self._image_field_name)
 
     def form_invalid(self, form):
         """If the form is invalid, render the invalid form error."""
@@ -337,6 +569,23 @@ class BaseListViewMixin(BaseImageModelMixin, BaseListView):
     def setup(self, request, *args, **kwargs):
         super().setup(request, *args, **kwargs)
         self._pks = self.get_and_validate_pks_from_request()
+        self._objects = None
+        self._image_list_cacheable = False
+
+    def get(self, request, *args, **kwargs):
+        list_cache_key = self.get_image_list_cache_key()
+        if list_cache_key is not None:
+            content = cache.get(list_cache_key)
+            if content is not None:
+                return HttpResponse(content, content_type="application/json")
+
+        response = super().get(request, *args, **kwargs)
+
+        if (list_cache_key is not None and self._image_list_cacheable
+                and response.status_code == 200):
+            cache.set(list_cache_key, response.content,
+                      conf.IMAGE_DATA_CACHE_TIMEOUT)
+        return response
 
     def get_and_validate_pks_from_request(self):
         # convert the request data "pks" (which is supposed to
@@ -347,78 +596,180 @@ class BaseListViewMixin(BaseImageModelMixin, BaseListView):
             raise SuspiciousOperation(
                 gettext("The request doesn't contain pks data"))
 
+        pks = unquote(pks)
+
+        # Validating the shape of the whole string at once, rather than
+        # checking the loaded items one by one.
+        if PKS_PATTERN.fullmatch(pks) is None:
+            raise SuspiciousOperation(
+                gettext("pks should be a list of integers, while got %s"
+                        % pks))
+
         try:
-            pks = json.loads(unquote(pks))
-            assert isinstance(pks, list)
+            pks = json_loads(pks)
         except Exception as e:
             raise SuspiciousOperation(
                 gettext("Invalid format of pks %s: %s: %s" %
                         (str(pks), type(e).__name__, str(e))))
-        else:
-            for pk in pks:
-                if not str(pk).isdigit():
-                    raise SuspiciousOperation(
-                        gettext(
-                            "pks should only contain integers, while got %s"
-                            % str(pk)))
-        return pks
+        return [int(pk) for pk in pks]
 
     def get_queryset(self):
-        # We have to override this method, because currently super().get_queryset
-        # doesn't accept Case in 'order_by'
-        # See https://github.com/django/django/pull/14757
-        queryset = self.model._default_manager.all()
-        ordering = self.get_ordering()
-        if ordering:  # pragma: no cover
-            if not isinstance(ordering, (list, tuple)):
-                ordering = (ordering,)
-            queryset = queryset.order_by(*ordering)
-
-        return queryset.filter(pk__in=self._pks)
-
-    def get_ordering(self):
-        # Preserving the sequence while filter by (id__in=pks)
-        # See https://stackoverflow.com/a/37648265/3437454
-        preserved = Case(
-            *[When(pk=pk, then=pos) for pos, pk in enumerate(self._pks)])
-        return preserved
+        queryset = super().get_queryset().filter(pk__in=self._pks)
+
+        if not any(hasattr(self.model, method)
+                   for method in MODEL_SERIALIZATION_METHODS):
+            # Only the image field is needed in serializing the images.
+            # The dimension fields, if any, are read by the image field
+            # when the instances are initialized.
+            image_field = self.model._meta.get_field(self._image_field_name)
+            queryset = queryset.only(
+                "pk", self._image_field_name,
+                *filter(None, (image_field.width_field,
+                               image_field.height_field)))
+
+        return queryset
+
+    def _get_thumbnail_in_worker(self, image):
+        try:
+            return self.get_thumbnail(image)
+        finally:
+            # The kvstore of sorl.thumbnail might have opened a db connection
+            # in this worker thread.
+            connections.close_all()
+
+    def get_objects(self):
+        if self._objects is None:
+            # Preserving the sequence of pks in the request. Sorting in Python
+            # rather than ordering by a Case expression with a When for each pk.
+            fetched = {obj.pk: obj for obj in self.get_queryset()}
+            self._objects = [
+                fetched[pk] for pk in dict.fromkeys(self._pks) if pk in fetched]
+        return self._objects
+
+    def get_image_list_cache_key(self):
+        """Return the key used to cache the whole response content, or
+        ``None`` if the response should not be cached. The key changes when
+        any of the image files is modified.
+        """
+        if conf.IMAGE_DATA_CACHE_TIMEOUT == 0:
+            return None
+
+        # serialize_extra might return data varied by request.
+        if any(hasattr(self.model, method)
+               for method in MODEL_SERIALIZATION_METHODS):
+            return None
+
+        objs = self.get_objects()
+        if not objs:
+            return None
+
+        cache_keys = [self._get_image_data_cache_key(obj) for obj in objs]
+        if None in cache_keys:
+            return None
+
+        return "galleryfield-image-list:" + hashlib.sha1(
+            "|".join(cache_keys).encode()).hexdigest()
 
     def get_context_data(self, **kwargs):
+        objs = self.get_objects()
+
+        if conf.IMAGE_DATA_CACHE_TIMEOUT != 0:
+            # Fetching the cached image data with a single cache query.
+            cache_keys = [self._get_image_data_cache_key(obj) for obj in objs]
+            self._prefetched_image_data = cache.get_many(
+                [key for key in cache_keys if key is not None])
+
+            # Only the images not cached need thumbnails
+            objs_without_data = [
+                obj for obj, key in zip(objs, cache_keys)
+                if key not in self._prefetched_image_data]
+        else:
+            objs_without_data = objs
+
+        if conf.THUMBNAIL_WORKERS > 1 and len(objs_without_data) > 1:
+            # Thumbnails which are not cached yet are generated concurrently.
+            with ThreadPoolExecutor(
+                    max_workers=min(
+                        conf.THUMBNAIL_WORKERS, len(objs_without_data))
+            ) as executor:
+                self._thumbnail_futures = {
+                    obj.pk: executor.submit(
+                        self._get_thumbnail_in_worker,
+                        getattr(obj, self._image_field_name))
+                    for obj in objs_without_data}
+
         # Return a list of serialized files
         context = {
-            "files":  [self.get_serialized_image_data(obj)
-                       for obj in self.get_queryset()]}
+            "files":  [self.get_serialized_image_data(obj) for obj in objs]}
         context.update(kwargs)
 
+        self._image_list_cacheable = not any(
+            "error" in image_data for image_data in context["files"])
+
         return context
 
 
-class CropError(Exception):
-    pass
+get_crop_box_values = itemgetter("x", "y", "width", "height", "rotate")
 
+_crop_executor = None
+_crop_executor_lock = threading.Lock()
 
-class BaseCropViewMixin(ImageFormViewMixin, BaseImageModelMixin, UpdateView):
-    http_method_names = ['post']
 
-    def get_form_class(self):
-        # Here we were simulating the request is done through
-        # a form. In this way, we can used ImageField to validate
-        # the file.
-        this = self
+def get_crop_executor():
+    """The process pool shared by crop views, which is created on first use
+    when ``server_side_crop_workers`` is configured.
+    """
+    global _crop_executor
+    with _crop_executor_lock:
+        if _crop_executor is None:
+            # Forking a (multi-threaded) server process is unsafe, and
+            # the workers don't need anything from it.
+            _crop_executor = ProcessPoolExecutor(
+                max_workers=conf.SERVER_SIDE_CROP_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"))
+    return _crop_executor
+
+
+def _discard_crop_executor(executor):
+    global _crop_executor
+    with _crop_executor_lock:
+        if _crop_executor is executor:
+            _crop_executor = None
+    executor.shutdown(wait=False)
+
+
+def crop_image_in_worker(*crop_args):
+    """Crop the image with :func:`galleryfield.crop.crop_image` in the
+    process pool. A broken pool (e.g., a worker was killed for running out
+    of memory) is replaced by a new one, and the crop is retried once.
+    """
+    for retry in (True, False):
+        executor = get_crop_executor()
+        try:
+            return executor.submit(crop_image, *crop_args).result(
+                timeout=conf.SERVER_SIDE_CROP_TIMEOUT)
+        except BrokenProcessPool:
+            _discard_crop_executor(executor)
+            if not retry:
+                raise SuspiciousOperation(
+                    gettext("Error while cropping the image"))
+        except FuturesTimeoutError:
+            # The hung worker would keep the pool occupied.
+            _discard_crop_executor(executor)
+            raise SuspiciousOperation(
+                gettext("Timed out while cropping the image"))
 
-        class ImageForm(forms.ModelForm):
-            class Meta:
-                model = this.model
-                fields = (this._image_field_name,)
 
-            def __init__(self, **kwargs):
-                super().__init__(**kwargs)
+class BaseCropViewMixin(ImageFormViewMixin, BaseImageModelMixin, UpdateView):
+    http_method_names = ['post']
 
-                new_uploaded_file = this.get_cropped_uploaded_file(self.instance)
-                self.instance.pk = None
-                self.initial = {this._image_field_name: new_uploaded_file}
+    def get_form_class(self):
+        return get_image_crop_form_class(self.model, self._image_field_name)
 
-        return ImageForm
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["get_cropped_uploaded_file"] = self.get_cropped_uploaded_file
+        return kwargs
 
     def setup(self, request, *args, **kwargs):
         if self.disable_server_side_crop:
@@ -429,7 +780,7 @@ class BaseCropViewMixin(ImageFormViewMixin, BaseImageModelMixin, UpdateView):
 
     def get_and_validate_cropped_result_from_request(self):
         try:
-            cropped_result = json.loads(self.request.POST["cropped_result"])
+            cropped_result = json_loads(self.request.POST["cropped_result"])
         except Exception as e:
             if isinstance(e, KeyError):
                 raise SuspiciousOperation(
@@ -439,21 +790,13 @@ class BaseCropViewMixin(ImageFormViewMixin, BaseImageModelMixin, UpdateView):
                         % (type(e).__name__, str(e))))
         else:
             try:
-                x = int(float(cropped_result['x']))
-                y = int(float(cropped_result['y']))
-                width = int(float(cropped_result['width']))
-                height = int(float(cropped_result['height']))
-                rotate = int(float(cropped_result['rotate']))
+                x, y, width, height, rotate = (
+                    int(float(v)) for v in get_crop_box_values(cropped_result))
 
                 # todo: allow show resized image in model ui
-                try:
-                    scale_x = float(cropped_result['scaleX'])
-                except KeyError:
-                    scale_x = None
-                try:
-                    scale_y = float(cropped_result['scaleY'])
-                except KeyError:
-                    scale_y = None
+                scale_x, scale_y = (
+                    float(cropped_result[k]) if k in cropped_result else None
+                    for k in ("scaleX", "scaleY"))
             except Exception:
                 raise SuspiciousOperation(
                     gettext('Wrong format of crop_result data.'))
@@ -466,38 +809,61 @@ class BaseCropViewMixin(ImageFormViewMixin, BaseImageModelMixin, UpdateView):
         # image
         old_image = getattr(old_instance, self._image_field_name)
 
-        try:
-            new_image = Image.open(old_image.path)
-        except IOError:
-            raise SuspiciousOperation(
-                gettext('File not found，please re-upload the image'))
-
-        image_format = new_image.format
-
         x, y, width, height, rotate, scale_x, scale_y = self._cropped_result
 
-        if rotate != 0:
-            # or it will raise "AttributeError: 'NoneType' object has no attribute
-            # 'mode' error in pillow 3.3.0
-            new_image = new_image.rotate(-rotate, expand=True)
+        crop_args = (old_image.path, x, y, width, height, rotate)
 
-        box = (x, y, x + width, y + height)
-        new_image = new_image.crop(box)
+        try:
+            if conf.SERVER_SIDE_CROP_WORKERS > 0:
+                # Decoding and encoding images in other processes, so that
+                # the workers of the server are not blocked or bloated by
+                # that.
+                result = crop_image_in_worker(*crop_args)
+            else:
+                result = crop_image_with_vips(*crop_args)
 
-        new_image_io = BytesIO()
-        new_image.save(new_image_io, format=image_format)
+            if result is not None:
+                content, content_type = result
+                new_image_io = BytesIO(content)
+                new_image_io.seek(0, os.SEEK_END)
+            else:
+                # Large results are spilled to disk, the same way as Django
+                # does for uploaded files.
+                new_image_io = SpooledTemporaryFile(
+                    max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+                content_type = crop_image_with_pillow(
+                    *crop_args, _UnsupportedFilenoWriter(new_image_io))
+        except CropError:
+            raise SuspiciousOperation(
+                gettext('File not found，please re-upload the image'))
 
         upload_file = InMemoryUploadedFile(
             file=new_image_io,
             field_name=self._image_field_name,
             name=old_image.name,
-            content_type=Image.MIME[image_format],
+            content_type=content_type,
             size=new_image_io.tell(),
             charset=None
         )
         return upload_file
 
 
+class _UnsupportedFilenoWriter:
+    """Pillow writes to the file descriptor of the output if it has one,
+    which would roll a :class:`tempfile.SpooledTemporaryFile` over to disk
+    regardless of the size of the result.
+    """
+
+    def __init__(self, file):
+        self._file = file
+
+    def fileno(self):
+        raise UnsupportedOperation("fileno")
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
 class GalleryFormMediaMixin:
     # todo: testcase (both settings and render)
     class Media:
@@ -15,6 +15,13 @@ install_requires = [
     'pillow'
 ]
 
+extras_require = {
+    # Faster, lower-memory server side cropping via libvips
+    'vips': ['pyvips'],
+    # Faster parsing of the json data posted to the views
+    'orjson': ['orjson'],
+}
+
 setup(
     name='django-galleryfield',
     version=galleryfield.__version__,
@@ -51,6 +58,7 @@ setup(
     include_package_data=True,
     zip_safe=True,
     install_requires=install_requires,
+    extras_require=extras_require,
     entry_points="""
         # -*- Entry points: -*-
     """,
@@ -7,6 +7,12 @@ class FakeValidImageModel(models.Model):
     image = models.ImageField()
 
 
+class FakeValidDimensionedImageModel(models.Model):
+    image = models.ImageField(width_field="width", height_field="height")
+    width = models.PositiveIntegerField(null=True)
+    height = models.PositiveIntegerField(null=True)
+
+
 class DemoGalleryForTest(models.Model):
     images = GalleryField(target_model="tests.FakeValidImageModel")
 
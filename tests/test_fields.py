@@ -1,16 +1,23 @@
+import json
+import pickle
 import random
 from unittest import mock
 
 from django import forms
 from django.core.exceptions import ImproperlyConfigured
-from django.db import models
+from django.db import connection, models
 from django.forms import ValidationError
 from django.forms.widgets import Textarea
 from django.test import TestCase
-from django.test.utils import isolate_apps, override_settings
+from django.test.utils import (CaptureQueriesContext, isolate_apps,
+                               override_settings)
 
 from demo.models import DemoGallery
-from galleryfield.fields import GalleryField, GalleryFormField
+from galleryfield.fields import (GalleryDescriptor, GalleryField,
+                                 GalleryFormField, MaxNumberOfImageValidator,
+                                 RawJSON, get_target_model_image_field)
+from galleryfield.models import BuiltInGalleryImage
+from galleryfield.utils import get_or_check_image_field
 from galleryfield.widgets import GalleryWidget
 from tests import factories
 from tests.factories import DemoGalleryFactory
@@ -116,6 +123,46 @@ class GalleryFieldTest(TestCase):
 
         self.assertFalse(form.is_valid())
 
+    def test_gallery_images_wrapped_once(self):
+        gallery = DemoGalleryFactory.create(
+            creator=self.user, number_of_images=2)
+        gallery = DemoGallery.objects.get(pk=gallery.pk)
+
+        images = gallery.images
+        with mock.patch(
+                "galleryfield.fields.DeferredAttribute.__get__") as mock_get:
+            self.assertIs(gallery.images, images)
+        mock_get.assert_not_called()
+
+        gallery.images = [images[0]]
+        self.assertEqual(gallery.images, [images[0]])
+        self.assertIsNot(gallery.images, images)
+
+    def test_gallery_images_pickled(self):
+        gallery = DemoGalleryFactory.create(
+            creator=self.user, number_of_images=2)
+        gallery = DemoGallery.objects.get(pk=gallery.pk)
+        self.assertFalse(hasattr(gallery.images, "__dict__"))
+
+        unpickled = pickle.loads(pickle.dumps(gallery))
+        self.assertEqual(unpickled.images, gallery.images)
+        self.assertIs(unpickled.images.instance, unpickled)
+        self.assertEqual(
+            list(unpickled.images.objects), list(gallery.images.objects))
+
+    def test_gallery_images_model_resolved_once(self):
+        gallery = DemoGalleryFactory.create(
+            creator=self.user, number_of_images=2)
+        gallery = DemoGallery.objects.get(pk=gallery.pk)
+        image_model = gallery.images.objects.model
+
+        with mock.patch(
+                "galleryfield.fields.apps.get_model",
+                return_value=image_model) as mock_get_model:
+            gallery.images.objects
+            DemoGallery.objects.get(pk=gallery.pk).images.objects
+        mock_get_model.assert_not_called()
+
 
 class GalleryFormFieldTest(TestCase):
     def setUp(self) -> None:
@@ -138,9 +185,59 @@ class GalleryFormFieldTest(TestCase):
         image = factories.BuiltInGalleryImageFactory(creator=self.user)
         field = GalleryFormField()
         form_data = [image.pk]
-        cleaned_data = field.clean(form_data)
+        with self.assertNumQueries(1):
+            cleaned_data = field.clean(form_data)
         self.assertEqual(cleaned_data, form_data)
 
+    def test_gallery_form_field_image_model_resolved_once(self):
+        image = factories.BuiltInGalleryImageFactory(creator=self.user)
+        field = GalleryFormField()
+
+        with mock.patch(
+                "galleryfield.fields.apps.get_model",
+                return_value=type(image)) as mock_get_model:
+            field.clean([image.pk])
+            field.clean([image.pk])
+        self.assertEqual(mock_get_model.call_count, 1)
+
+    def test_gallery_form_field_clean_pks_exceed_max_query_params(self):
+        images = factories.BuiltInGalleryImageFactory.create_batch(
+            size=4, creator=self.user)
+        field = GalleryFormField()
+        form_data = [images[3].pk, 100, images[0].pk, images[2].pk,
+                     images[3].pk, images[1].pk]
+
+        with mock.patch.object(connection.features, "max_query_params", 2):
+            with self.assertNumQueries(3):
+                cleaned_data = field.clean(form_data)
+
+        self.assertEqual(
+            cleaned_data,
+            [images[3].pk, images[0].pk, images[2].pk, images[3].pk,
+             images[1].pk])
+
+    def test_gallery_form_field_clean_duplicated_pks(self):
+        images = factories.BuiltInGalleryImageFactory.create_batch(
+            size=2, creator=self.user)
+        field = GalleryFormField()
+
+        form_data = [images[1].pk, images[0].pk, images[1].pk]
+        self.assertEqual(field.clean(form_data), form_data)
+
+        form_data = [images[1].pk, 100, images[1].pk]
+        self.assertEqual(field.clean(form_data), [images[1].pk, images[1].pk])
+
+    def test_gallery_form_field_clean_some_images_not_exist(self):
+        images = factories.BuiltInGalleryImageFactory.create_batch(
+            size=3, creator=self.user)
+        field = GalleryFormField()
+        form_data = [images[2].pk, 100, images[0].pk, 101, images[1].pk]
+
+        with self.assertNumQueries(1):
+            cleaned_data = field.clean(form_data)
+        self.assertEqual(
+            cleaned_data, [images[2].pk, images[0].pk, images[1].pk])
+
     def test_gallery_form_field_clean_null_required(self):
         field = GalleryFormField(required=True)
         inputs = [
@@ -168,6 +265,15 @@ class GalleryFormFieldTest(TestCase):
             with self.subTest(data=data):
                 self.assertIsNone(field.clean(data))
 
+    def test_gallery_form_field_clean_empty_list_json(self):
+        with mock.patch("django.forms.fields.json.loads") as mock_loads:
+            with self.assertRaisesMessage(
+                    ValidationError, "'The submitted file is empty.'"):
+                GalleryFormField(required=True).clean("[]")
+
+            self.assertEqual(GalleryFormField(required=False).clean("[]"), [])
+            mock_loads.assert_not_called()
+
     def test_gallery_form_field_clean_invalid_image_json(self):
         inputs = ['invalid-image']
         msg = "The submitted images are invalid."
@@ -178,6 +284,24 @@ class GalleryFormFieldTest(TestCase):
                 with self.assertRaisesMessage(ValidationError, msg):
                     field.clean(inputs)
 
+    def test_gallery_form_field_clean_invalid_pks(self):
+        image = factories.BuiltInGalleryImageFactory(creator=self.user)
+        msg = "The submitted images are invalid."
+
+        for pks in [[True], [image.pk, -1], [-1, image.pk], [image.pk, True],
+                    [1.0], ["-1"], ["1.0"], [" 1"], ["\u00b2"], [None], [[1]]]:
+            with self.subTest(pks=pks):
+                with self.assertRaisesMessage(ValidationError, msg):
+                    GalleryFormField().clean(pks)
+
+    def test_gallery_form_field_clean_str_pks(self):
+        image = factories.BuiltInGalleryImageFactory(creator=self.user)
+        self.assertEqual(
+            GalleryFormField().clean([str(image.pk), image.pk, "100"]),
+            [image.pk, image.pk])
+        self.assertEqual(
+            GalleryFormField().clean(f'["{image.pk}"]'), [image.pk])
+
     def test_gallery_form_field_clean_not_null_not_list(self):
         input_str = 'invalid-image'
         msg = "The submitted images are invalid."
@@ -243,6 +367,26 @@ class GalleryFormFieldTest(TestCase):
         with self.assertRaisesMessage(ValidationError, msg):
             field.clean([images[0].pk, images[1].pk])
 
+    def test_gallery_form_field_max_number_of_images_validator_replaced(self):
+        field = GalleryFormField()
+        images = factories.BuiltInGalleryImageFactory.create_batch(
+            size=3, creator=self.user)
+        pks = [image.pk for image in images]
+
+        for n in [1, 1, 2]:
+            field.max_number_of_images = n
+        self.assertEqual(
+            len([v for v in field.validators
+                 if isinstance(v, MaxNumberOfImageValidator)]), 1)
+
+        with self.assertRaises(ValidationError) as cm:
+            field.clean(pks)
+        self.assertEqual(cm.exception.messages,
+                         ["Number of images exceeded, only 2 allowed"])
+
+        field.max_number_of_images = None
+        self.assertEqual(field.clean(pks), pks)
+
     def test_gallery_form_field_clean_max_number_of_images_not_exceeded(self):
         field = GalleryFormField()
         field.max_number_of_images = 1
@@ -343,6 +487,51 @@ class GalleryFormFieldTest(TestCase):
         image_pks = my_gallery.images
         self.assertIn(str(image_pks), form.as_table())
 
+    def test_gallery_form_field_bound_value_passed_through(self):
+        image = factories.BuiltInGalleryImageFactory(creator=self.user)
+        form = DemoTestGalleryModelForm(data={"images": f"[{image.pk}]"})
+
+        with mock.patch("django.forms.fields.json.loads") as mock_loads:
+            value = form["images"].value()
+            mock_loads.assert_not_called()
+
+        self.assertIsInstance(value, RawJSON)
+        self.assertEqual(value, f"[{image.pk}]")
+
+    def test_gallery_form_field_pks_validated_once_per_form(self):
+        my_gallery = factories.DemoGalleryFactory.create(
+            creator=self.user, number_of_images=2)
+        image = factories.BuiltInGalleryImageFactory(creator=self.user)
+        image_pks = my_gallery.images + [image.pk]
+
+        form = DemoTestGalleryModelForm(
+            data={"images": json.dumps(image_pks)}, instance=my_gallery)
+        with self.assertNumQueries(1):
+            self.assertTrue(form.is_valid())
+            self.assertTrue(form.has_changed())
+            self.assertEqual(form.changed_data, ["images"])
+        self.assertEqual(form.cleaned_data["images"], image_pks)
+
+        # Not shared by forms
+        image.delete()
+        form = DemoTestGalleryModelForm(
+            data={"images": json.dumps(image_pks)}, instance=my_gallery)
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data["images"], image_pks[:-1])
+
+    def test_gallery_form_field_clean_rechecks_pks(self):
+        images = factories.BuiltInGalleryImageFactory.create_batch(
+            2, creator=self.user)
+        image_pks = [image.pk for image in images]
+        value = json.dumps(image_pks)
+
+        field = GalleryFormField(required=False)
+        self.assertEqual(field.clean(value), image_pks)
+
+        images[1].delete()
+        with self.assertNumQueries(1):
+            self.assertEqual(field.clean(value), image_pks[:1])
+
     def test_gallery_form_field_textarea_widget_value_sequence(self):
         # create a gallery with 5 images pk randomized
         my_gallery = factories.DemoGalleryFactory.create(
@@ -362,6 +551,216 @@ class GalleryFormFieldTest(TestCase):
         self.assertEqual(form.cleaned_data["images"], image_pks)
 
 
+class GalleryImagesObjectsTest(TestCase):
+    def setUp(self) -> None:
+        factories.UserFactory.reset_sequence()
+        factories.BuiltInGalleryImageFactory.reset_sequence()
+        factories.DemoGalleryFactory.reset_sequence()
+        self.user = factories.UserFactory()
+        super().setUp()
+
+        images = factories.BuiltInGalleryImageFactory.create_batch(
+            size=5, creator=self.user)
+        self.pks = [images[i].pk for i in (3, 1, 4, 0, 2)]
+        gallery = DemoGalleryFactory.create(creator=self.user)
+        gallery.images = self.pks
+        gallery.save()
+        self.gallery = DemoGallery.objects.get(pk=gallery.pk)
+
+    def test_objects_ordered(self):
+        with CaptureQueriesContext(connection) as ctx:
+            objs = list(self.gallery.images.objects.all())
+
+        self.assertEqual([obj.pk for obj in objs], self.pks)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn("CASE", ctx.captured_queries[0]["sql"])
+
+    def test_objects_filtered(self):
+        excluded = self.pks[1]
+        self.assertEqual(
+            [obj.pk for obj in
+             self.gallery.images.objects.exclude(pk=excluded)],
+            [pk for pk in self.pks if pk != excluded])
+
+    def test_objects_sliced(self):
+        objects = self.gallery.images.objects
+        self.assertEqual([obj.pk for obj in objects[1:3]], self.pks[1:3])
+        self.assertEqual(objects[2].pk, self.pks[2])
+        self.assertEqual(objects.first().pk, self.pks[0])
+        self.assertEqual(objects.last().pk, self.pks[-1])
+
+    def test_objects_sliced_order_not_selected(self):
+        with CaptureQueriesContext(connection) as ctx:
+            list(self.gallery.images.objects[:2])
+
+        select, _, rest = ctx.captured_queries[0]["sql"].partition(" FROM ")
+        self.assertNotIn("CASE", select)
+        self.assertIn("ORDER BY CASE", rest)
+
+    def test_objects_reversed(self):
+        self.assertEqual(
+            [obj.pk for obj in self.gallery.images.objects.reverse()],
+            self.pks[::-1])
+
+    def test_objects_reversed_sliced_and_iterator(self):
+        objects = self.gallery.images.objects.reverse()
+        self.assertEqual([obj.pk for obj in objects[:2]], self.pks[::-1][:2])
+        self.assertEqual(
+            [obj.pk for obj in objects.iterator()], self.pks[::-1])
+        self.assertEqual(
+            list(objects.values_list("pk", flat=True)), self.pks[::-1])
+        self.assertEqual(objects.first().pk, self.pks[-1])
+        self.assertEqual(objects.last().pk, self.pks[0])
+        self.assertEqual(
+            [obj.pk for obj in objects.reverse()], self.pks)
+
+    def test_objects_reversed_then_order_by(self):
+        self.assertEqual(
+            [obj.pk for obj in
+             self.gallery.images.objects.reverse().order_by("pk")],
+            sorted(self.pks, reverse=True))
+
+    def test_objects_latest_and_earliest(self):
+        objects = self.gallery.images.objects
+        self.assertEqual(objects.latest("pk").pk, max(self.pks))
+        self.assertEqual(objects.earliest("pk").pk, min(self.pks))
+        self.assertEqual(
+            objects.reverse().latest("pk"),
+            BuiltInGalleryImage.objects.reverse().latest("pk"))
+
+        with mock.patch.object(
+                BuiltInGalleryImage._meta, "get_latest_by", "pk"):
+            self.assertEqual(objects.latest().pk, max(self.pks))
+            self.assertEqual(objects.earliest().pk, min(self.pks))
+
+    def test_objects_values_list_and_iterator(self):
+        objects = self.gallery.images.objects
+        self.assertEqual(list(objects.values_list("pk", flat=True)), self.pks)
+        self.assertEqual(
+            [obj.pk for obj in objects.iterator()], self.pks)
+
+    def test_objects_order_by(self):
+        self.assertEqual(
+            [obj.pk for obj in self.gallery.images.objects.order_by("-pk")],
+            sorted(self.pks, reverse=True))
+
+    def test_objects_select_and_prefetch_related(self):
+        field = DemoGallery._meta.get_field("images")
+        for attr in ["select_related", "prefetch_related"]:
+            with self.subTest(attr=attr):
+                with mock.patch.object(field, attr, ("creator",)):
+                    gallery = DemoGallery.objects.get(pk=self.gallery.pk)
+                    with self.assertNumQueries(
+                            1 if attr == "select_related" else 2):
+                        creators = [
+                            obj.creator for obj in gallery.images.objects]
+                self.assertEqual(creators, [self.user] * len(self.pks))
+
+    def test_objects_list_modified(self):
+        removed = self.gallery.images.pop(1)
+        self.gallery.images.insert(0, removed)
+        self.gallery.images.pop()
+        self.assertEqual(
+            [obj.pk for obj in self.gallery.images.objects],
+            [removed] + [pk for pk in self.pks[:-1] if pk != removed])
+
+    def test_objects_empty(self):
+        for value in [[], None]:
+            with self.subTest(value=value):
+                self.gallery.images = value
+                self.gallery.save()
+                gallery = DemoGallery.objects.get(pk=self.gallery.pk)
+
+                with self.assertNumQueries(0):
+                    objects = gallery.images.objects
+                    self.assertEqual(list(objects), [])
+                    self.assertEqual(objects.count(), 0)
+                    self.assertFalse(objects.exists())
+
+    def test_objects_pks_saved_as_str(self):
+        self.gallery.images = [str(pk) for pk in self.pks]
+        self.gallery.save()
+        gallery = DemoGallery.objects.get(pk=self.gallery.pk)
+        self.assertEqual(
+            [obj.pk for obj in gallery.images.objects], self.pks)
+
+
+class GalleryFieldDeconstructTest(TestCase):
+    def test_deconstruct(self):
+        field = GalleryField()
+        _, _, _, kwargs = field.deconstruct()
+        self.assertNotIn("select_related", kwargs)
+        self.assertNotIn("prefetch_related", kwargs)
+
+        field = GalleryField(
+            select_related=["creator"], prefetch_related=("creator__groups",))
+        _, _, _, kwargs = field.deconstruct()
+        self.assertEqual(kwargs["select_related"], ("creator",))
+        self.assertEqual(kwargs["prefetch_related"], ("creator__groups",))
+
+        new_field = GalleryField(**kwargs)
+        self.assertEqual(new_field.select_related, ("creator",))
+        self.assertEqual(new_field.prefetch_related, ("creator__groups",))
+
+    def test_deconstruct_related_lookups_str(self):
+        field = GalleryField(
+            select_related="creator", prefetch_related="creator__groups")
+        self.assertEqual(field.select_related, ("creator",))
+        self.assertEqual(field.prefetch_related, ("creator__groups",))
+
+        _, _, _, kwargs = field.deconstruct()
+        self.assertEqual(kwargs["select_related"], ("creator",))
+        self.assertEqual(kwargs["prefetch_related"], ("creator__groups",))
+
+
+class GetTargetModelImageFieldTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.dict(
+            "galleryfield.fields._target_model_image_fields", clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_resolved_once(self):
+        with mock.patch(
+                "galleryfield.fields.get_or_check_image_field",
+                wraps=get_or_check_image_field) as mock_get_image_field:
+            fields = [GalleryField() for _ in range(3)]
+            fields.append(GalleryField("galleryfield.BuiltInGalleryImage"))
+
+        self.assertEqual(mock_get_image_field.call_count, 2)
+        for field in fields:
+            self.assertEqual(
+                field.target_model_image_field,
+                BuiltInGalleryImage._meta.get_field("image"))
+
+    def test_not_cached_if_not_resolved(self):
+        with mock.patch(
+                "galleryfield.fields.get_or_check_image_field",
+                return_value=None) as mock_get_image_field:
+            self.assertIsNone(get_target_model_image_field(None))
+            self.assertIsNone(get_target_model_image_field(None))
+        self.assertEqual(mock_get_image_field.call_count, 2)
+
+        self.assertIsNotNone(get_target_model_image_field(None))
+
+
+class GalleryFieldContributeToClassTest(TestCase):
+    @isolate_apps("tests")
+    def test_descriptor_installed_once(self):
+        with mock.patch(
+                "galleryfield.fields.GalleryDescriptor.__init__",
+                autospec=True, side_effect=GalleryDescriptor.__init__
+        ) as mock_init:
+            class MyModel(models.Model):
+                field = GalleryField()
+
+        self.assertEqual(mock_init.call_count, 1)
+        descriptor = MyModel.__dict__["field"]
+        self.assertIsInstance(descriptor, GalleryDescriptor)
+        self.assertIs(descriptor.field, MyModel._meta.get_field("field"))
+
+
 class GalleryFieldCheckTest(TestCase):
     def test_field_checks_valid(self):
 
@@ -1,7 +1,23 @@
+import datetime
+import json
+import os
+import uuid
+from decimal import Decimal
+from io import BytesIO
+from tempfile import TemporaryDirectory
+from unittest import mock, skipUnless
+
 from django.core.exceptions import ImproperlyConfigured
+from django.forms.utils import ErrorDict, ErrorList
 from django.test import SimpleTestCase
 from django.urls import NoReverseMatch, reverse
+from django.utils.safestring import mark_safe
+from django.utils.translation import gettext_lazy
+from PIL import Image, ImageChops
 
+from galleryfield.crop import (crop_image_with_pillow, crop_image_with_vips,
+                               get_rotate_crop_affine_data, pyvips)
+from galleryfield.mixins import JSON_RESPONSE_ENCODER, json_dumps
 from galleryfield.utils import get_url_from_str
 
 
@@ -42,3 +58,114 @@ class GetUrlFromStrTest(SimpleTestCase):
             get_url_from_str("/foo/bar", require_urlconf_ready=True)
         self.assertIn("is not a valid view function or pattern name",
                       cm.exception.args[0])
+
+
+class GetRotateCropAffineDataTest(SimpleTestCase):
+    # Test galleryfield.crop.get_rotate_crop_affine_data
+
+    def test_same_as_rotate_then_crop(self):
+        image = Image.effect_noise((301, 203), 80).convert("RGB")
+
+        for rotate in [90, -90, 180, -180, 270, -270, 360]:
+            for x, y, width, height in [
+                    (10, 20, 100, 80), (0, 0, 203, 301), (50, 5, 400, 400)]:
+                with self.subTest(rotate=rotate, box=(x, y, width, height)):
+                    expected = image.rotate(-rotate, expand=True).crop(
+                        (x, y, x + width, y + height))
+                    result = image.transform(
+                        (width, height), Image.AFFINE,
+                        get_rotate_crop_affine_data(image.size, rotate, x, y))
+                    self.assertIsNone(
+                        ImageChops.difference(expected, result).getbbox())
+
+
+@skipUnless(pyvips, "pyvips is not installed")
+class CropImageWithVipsTest(SimpleTestCase):
+    # Test galleryfield.crop.crop_image_with_vips against
+    # galleryfield.crop.crop_image_with_pillow
+
+    def crop(self, image, box, rotate):
+        with TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "image.png")
+            image.save(path)
+
+            content, content_type = crop_image_with_vips(path, *box, rotate)
+            self.assertEqual(content_type, "image/png")
+
+            output = BytesIO()
+            crop_image_with_pillow(path, *box, rotate, output)
+
+        return (Image.open(BytesIO(content)).convert("RGB"),
+                Image.open(output).convert("RGB"))
+
+    def test_same_as_pillow(self):
+        image = Image.effect_noise((301, 203), 80).convert("RGB")
+
+        for rotate in [0, 90, -90]:
+            for box in [(10, 20, 100, 80), (0, 0, 203, 203)]:
+                with self.subTest(rotate=rotate, box=box):
+                    result, expected = self.crop(image, box, rotate)
+                    self.assertEqual(result.size, expected.size)
+                    self.assertIsNone(
+                        ImageChops.difference(expected, result).getbbox())
+
+    def test_arbitrary_angle_close_to_pillow(self):
+        # Vips interpolates while Pillow takes the nearest pixel, so the
+        # results are compared on a smooth image with a tolerance.
+        width, height = 301, 203
+        gradient = Image.linear_gradient("L")
+        image = Image.merge("RGB", [
+            gradient.rotate(90).resize((width, height)),
+            gradient.resize((width, height)),
+            Image.new("L", (width, height), 128)])
+
+        for rotate in [17, -45]:
+            with self.subTest(rotate=rotate):
+                result, expected = self.crop(image, (120, 110, 80, 60), rotate)
+                self.assertEqual(result.size, expected.size)
+                for _, max_diff in ImageChops.difference(
+                        expected, result).getextrema():
+                    self.assertLessEqual(max_diff, 3)
+
+    def test_unsupported_format(self):
+        with TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "image.bmp")
+            Image.new("RGB", (10, 10)).save(path)
+            self.assertIsNone(crop_image_with_vips(path, 0, 0, 5, 5, 0))
+
+    def test_crop_box_out_of_image(self):
+        with TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "image.png")
+            Image.new("RGB", (10, 10)).save(path)
+            self.assertIsNone(crop_image_with_vips(path, 5, 5, 10, 10, 0))
+
+
+class JsonDumpsTest(SimpleTestCase):
+    # Test galleryfield.mixins.json_dumps
+
+    def test_same_as_json_response_encoder(self):
+        data = {
+            "files": [{"pk": 1, "name": "\u4e2d\u6587.jpg", "size": 1024}],
+            "datetime": datetime.datetime(2021, 1, 1, 12, 30, 15, 123456),
+            "date": datetime.date(2021, 1, 1),
+            "decimal": Decimal("1.50"),
+            "uuid": uuid.UUID("12345678123456781234567812345678"),
+            "lazy": gettext_lazy("The submitted file is empty."),
+            "errors": ErrorDict(image=ErrorList(["Upload a valid image."])),
+            "safe": mark_safe("<b>"),
+            1: 2 ** 64,
+        }
+        for obj in [data, {k: v for k, v in data.items() if k != 1}]:
+            with self.subTest(obj=obj):
+                self.assertEqual(
+                    json.loads(json_dumps(obj)),
+                    json.loads(JSON_RESPONSE_ENCODER.encode(obj)))
+
+    def test_orjson_not_installed(self):
+        with mock.patch("galleryfield.mixins.orjson", None):
+            self.assertEqual(json_dumps({"files": [{"pk": 1}]}),
+                             '{"files":[{"pk":1}]}')
+
+    def test_not_serializable(self):
+        with self.assertRaises(TypeError):
+            json_dumps({"files": object()})
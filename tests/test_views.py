@@ -1,16 +1,29 @@
 import json
 import os
+import signal
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
 from unittest import mock
+from urllib.parse import quote
 
 from django.contrib.staticfiles.finders import find
+from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured, SuspiciousOperation
+from django.db import connection
 from django.test import RequestFactory, TestCase
-from django.test.utils import override_settings
+from django.test.utils import CaptureQueriesContext, override_settings
 from django.urls import reverse
+from django.utils import translation
 from django.utils.http import urlencode
+from django.utils.translation import get_language
+from PIL import Image
 
 from galleryfield import defaults
 from galleryfield import image_views as built_in_views
+from galleryfield import mixins as galleryfield_mixins
+from galleryfield.mixins import get_crop_url_parts
 from galleryfield.models import BuiltInGalleryImage
 from tests import factories
 from tests.mixins import UserCreateMixin
@@ -127,6 +140,16 @@ class GalleryWidgetUploadViewTest(ViewTestMixin, TestCase):
         self.assertEqual(resp.status_code, 200, resp.content)
         self.assertEqual(BuiltInGalleryImage.objects.count(), 1)
 
+    def test_upload_form_class_reused(self):
+        request = self.factory.post(self.get_demo_upload_url())
+        form_classes = set()
+        for _ in range(2):
+            view = built_in_views.BuiltInImageCreateView()
+            view.request = request
+            view.setup_model_and_image_field()
+            form_classes.add(view.get_form_class())
+        self.assertEqual(len(form_classes), 1)
+
     def test_upload_fail_not_xml_request(self):
         resp = self.demo_upload_file(self.user, find("demo/screen_upload.png"),
                                      xml_request=False)
@@ -286,6 +309,361 @@ class GalleryWidgetFetchViewTest(ViewTestMixin, TestCase):
         self.c.force_login(another_user)
         self.assertEqual(len(get_fetched_result()), 0)
 
+    def test_fetch_response_compact_json(self):
+        gallery = factories.DemoGalleryFactory.create(
+            creator=self.user, number_of_images=2)
+
+        self.c.force_login(self.user)
+        resp = self.c.get(self.get_demo_fetch_url(
+            params={"pks": list(gallery.images)}),
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "application/json")
+        self.assertNotIn(b'": ', resp.content)
+        self.assertEqual(len(json.loads(resp.content)["files"]), 2)
+
+    def test_fetch_thumbnails_in_workers(self):
+        gallery = factories.DemoGalleryFactory.create(
+            creator=self.user, number_of_images=5,
+            shuffle=True)
+
+        request = self.factory.get(
+            self.get_demo_fetch_url(
+                params={"pks": list(gallery.images)}),
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        request.user = self.user
+
+        with mock.patch("galleryfield.conf.THUMBNAIL_WORKERS", 4):
+            with mock.patch(
+                    "galleryfield.mixins.get_thumbnail") as mock_get_thumb:
+                mock_get_thumb.return_value.url = "/thumbnail.jpg"
+                resp = built_in_views.BuiltInImageListView.as_view()(request)
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(mock_get_thumb.call_count, 5)
+
+        resp_files = json.loads(resp.content)['files']
+        self.assertEqual([f["pk"] for f in resp_files], list(gallery.images))
+        for f in resp_files:
+            self.assertEqual(f["thumbnailUrl"], "/thumbnail.jpg")
+
+    def test_fetch_storage_without_path(self):
+        gallery = factories.DemoGalleryFactory.create(
+            creator=self.user, number_of_images=2)
+        names = [os.path.basename(BuiltInGalleryImage.objects.get(pk=pk).image.path)
+                 for pk in gallery.images]
+
+        request = self.factory.get(
+            self.get_demo_fetch_url(
+                params={"pks": list(gallery.images)}),
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        request.user = self.user
+
+        # Remote storages don't implement path()
+        for timeout in (0, 60):
+            with self.subTest(image_data_cache_timeout=timeout):
+                with mock.patch("galleryfield.conf.IMAGE_DATA_CACHE_TIMEOUT",
+                                timeout):
+                    with mock.patch(
+                            "django.db.models.fields.files.FieldFile.path",
+                            new_callable=mock.PropertyMock,
+                            side_effect=NotImplementedError):
+                        with mock.patch("galleryfield.mixins.get_thumbnail"
+                                        ) as mock_get_thumb:
+                            mock_get_thumb.return_value.url = "/thumbnail.jpg"
+                            resp = built_in_views.BuiltInImageListView.as_view()(
+                                request)
+
+                self.assertEqual(resp.status_code, 200)
+                resp_files = json.loads(resp.content)['files']
+                self.assertEqual([f["name"] for f in resp_files], names)
+                for f in resp_files:
+                    self.assertNotIn("error", f)
+
+    def test_fetch_queryset_dimension_fields_not_deferred(self):
+        from tests.models import FakeValidDimensionedImageModel
+
+        pks = [FakeValidDimensionedImageModel.objects.create(
+            image=f"image{i}.png", width=10, height=20).pk
+            for i in range(3)]
+
+        request = self.factory.get(
+            self.get_demo_fetch_url(params={"pks": pks}),
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        request.user = self.user
+
+        view = built_in_views.ImageListView(
+            target_model="tests.FakeValidDimensionedImageModel",
+            disable_server_side_crop=True)
+        view.setup(request)
+
+        with self.assertNumQueries(1):
+            objs = view.get_objects()
+            self.assertEqual(
+                [(obj.pk, obj.width, obj.height) for obj in objs],
+                [(pk, 10, 20) for pk in pks])
+
+    def test_fetch_image_data_cached(self):
+        gallery = factories.DemoGalleryFactory.create(
+            creator=self.user, number_of_images=3)
+
+        def fetch():
+            request = self.factory.get(
+                self.get_demo_fetch_url(
+                    params={"pks": list(gallery.images)}),
+                HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+            request.user = self.user
+
+            with mock.patch(
+                    "galleryfield.mixins.get_thumbnail") as mock_get_thumb:
+                mock_get_thumb.return_value.url = "/thumbnail.jpg"
+                resp = built_in_views.BuiltInImageListView.as_view()(request)
+
+            self.assertEqual(resp.status_code, 200)
+            return json.loads(resp.content)['files'], mock_get_thumb.call_count
+
+        cache.clear()
+        with mock.patch("galleryfield.conf.IMAGE_DATA_CACHE_TIMEOUT", 60):
+            files, thumbnail_calls = fetch()
+            self.assertEqual(thumbnail_calls, 3)
+
+            cached_files, thumbnail_calls = fetch()
+            self.assertEqual(thumbnail_calls, 0)
+            self.assertEqual(cached_files, files)
+
+            # Modifying the image file invalidates its cached data
+            image = BuiltInGalleryImage.objects.get(pk=gallery.images[0])
+            stat = os.stat(image.image.path)
+            os.utime(image.image.path,
+                     ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+            _, thumbnail_calls = fetch()
+            self.assertEqual(thumbnail_calls, 1)
+
+        # Disabled by default
+        _, thumbnail_calls = fetch()
+        self.assertEqual(thumbnail_calls, 3)
+
+    def test_fetch_image_data_cache_varied_by_view_and_language(self):
+        gallery = factories.DemoGalleryFactory.create(
+            creator=self.user, number_of_images=3)
+
+        class OtherImageListView(built_in_views.BuiltInImageListView):
+            pass
+
+        def fetch(view_class):
+            request = self.factory.get(
+                self.get_demo_fetch_url(
+                    params={"pks": list(gallery.images)}),
+                HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+            request.user = self.user
+
+            with mock.patch(
+                    "galleryfield.mixins.get_thumbnail") as mock_get_thumb:
+                mock_get_thumb.return_value.url = "/thumbnail.jpg"
+                resp = view_class.as_view()(request)
+
+            self.assertEqual(resp.status_code, 200)
+            return mock_get_thumb.call_count
+
+        cache.clear()
+        with mock.patch("galleryfield.conf.IMAGE_DATA_CACHE_TIMEOUT", 60):
+            for view_class, language, expected_thumbnail_calls in [
+                    (built_in_views.BuiltInImageListView, "en", 3),
+                    (built_in_views.BuiltInImageListView, "fr", 3),
+                    (OtherImageListView, "en", 3),
+                    (built_in_views.BuiltInImageListView, "en", 0),
+                    (OtherImageListView, "fr", 3)]:
+                with self.subTest(view_class=view_class, language=language):
+                    with translation.override(language):
+                        self.assertEqual(
+                            fetch(view_class), expected_thumbnail_calls)
+
+    def test_fetch_response_content_cached(self):
+        gallery = factories.DemoGalleryFactory.create(
+            creator=self.user, number_of_images=3)
+        pks = list(gallery.images)
+
+        self.c.force_login(self.user)
+
+        def fetch(pks):
+            resp = self.c.get(
+                self.get_demo_fetch_url(params={"pks": pks}),
+                HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp["Content-Type"], "application/json")
+            return resp.content
+
+        cache.clear()
+        with mock.patch("galleryfield.conf.IMAGE_DATA_CACHE_TIMEOUT", 60):
+            content = fetch(pks)
+
+            with mock.patch(
+                    "galleryfield.mixins.BaseImageModelMixin"
+                    ".get_serialized_image_data") as mock_serialize:
+                self.assertEqual(fetch(pks), content)
+                mock_serialize.assert_not_called()
+
+                # The order of images matters
+                mock_serialize.return_value = {}
+                fetch(pks[::-1])
+                self.assertEqual(mock_serialize.call_count, 3)
+
+    def test_fetch_response_content_not_cached_with_serialize_extra(self):
+        gallery = factories.DemoGalleryFactory.create(
+            creator=self.user, number_of_images=2)
+
+        request = self.factory.get(
+            self.get_demo_fetch_url(
+                params={"pks": list(gallery.images)}),
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        request.user = self.user
+
+        cache.clear()
+        with mock.patch("galleryfield.conf.IMAGE_DATA_CACHE_TIMEOUT", 60):
+            with mock.patch.object(
+                    BuiltInGalleryImage, "serialize_extra", create=True,
+                    side_effect=[{"n": 1}, {"n": 1}, {"n": 2}, {"n": 2}]):
+                for n in (1, 2):
+                    resp = built_in_views.BuiltInImageListView.as_view()(
+                        request)
+                    self.assertEqual(
+                        [f["n"] for f in json.loads(resp.content)["files"]],
+                        [n, n])
+
+    def test_fetch_image_data_not_cached_with_errors(self):
+        gallery = factories.DemoGalleryFactory.create(
+            creator=self.user, number_of_images=2)
+
+        request = self.factory.get(
+            self.get_demo_fetch_url(
+                params={"pks": list(gallery.images)}),
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        request.user = self.user
+
+        cache.clear()
+        with mock.patch("galleryfield.conf.IMAGE_DATA_CACHE_TIMEOUT", 60):
+            with mock.patch(
+                    "galleryfield.mixins.get_thumbnail") as mock_get_thumb:
+                mock_get_thumb.side_effect = RuntimeError("Unexpected error")
+                built_in_views.BuiltInImageListView.as_view()(request)
+
+                mock_get_thumb.side_effect = None
+                mock_get_thumb.return_value.url = "/thumbnail.jpg"
+                resp = built_in_views.BuiltInImageListView.as_view()(request)
+
+        self.assertEqual(mock_get_thumb.call_count, 4)
+        for f in json.loads(resp.content)['files']:
+            self.assertNotIn("error", f)
+            self.assertEqual(f["thumbnailUrl"], "/thumbnail.jpg")
+
+    def test_fetch_preserve_sequence_duplicated_pks(self):
+        gallery = factories.DemoGalleryFactory.create(
+            creator=self.user, number_of_images=3)
+        pk1, pk2, pk3 = gallery.images
+
+        self.c.force_login(self.user)
+        resp = self.c.get(self.get_demo_fetch_url(
+            params={"pks": f'[{pk3}, "{pk1}", {pk3}, 10000, {pk2}]'}),
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(
+            [f["pk"] for f in json.loads(resp.content)['files']],
+            [pk3, pk1, pk2])
+
+    def test_fetch_pks_uri_encoded(self):
+        # The widget sends encodeURIComponent(JSON.stringify(pks))
+        gallery = factories.DemoGalleryFactory.create(
+            creator=self.user, number_of_images=2)
+        pks = list(gallery.images)
+
+        self.c.force_login(self.user)
+        for loads in [galleryfield_mixins.json_loads, json.loads]:
+            with self.subTest(loads=loads):
+                with mock.patch("galleryfield.mixins.json_loads", loads):
+                    resp = self.c.get(self.get_demo_fetch_url(
+                        params={"pks": quote(json.dumps(pks))}),
+                        HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+                self.assertEqual(resp.status_code, 200)
+                self.assertEqual(
+                    [f["pk"] for f in json.loads(resp.content)['files']], pks)
+
+    def test_fetch_only_image_field_selected(self):
+        gallery = factories.DemoGalleryFactory.create(
+            creator=self.user, number_of_images=3)
+
+        self.c.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.c.get(self.get_demo_fetch_url(
+                params={"pks": list(gallery.images)}),
+                HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(json.loads(resp.content)['files']), 3)
+
+        image_queries = [
+            q["sql"] for q in ctx.captured_queries
+            if q["sql"].startswith("SELECT")
+            and BuiltInGalleryImage._meta.db_table in q["sql"]]
+        self.assertEqual(len(image_queries), 1)
+        self.assertNotIn('"creator_id"', image_queries[0].split(" FROM ")[0])
+
+    def test_fetch_crop_url(self):
+        gallery = factories.DemoGalleryFactory.create(
+            creator=self.user, number_of_images=3)
+
+        self.c.force_login(self.user)
+        get_crop_url_parts.cache_clear()
+
+        def fetch():
+            _resp = self.c.get(self.get_demo_fetch_url(
+                params={"pks": list(gallery.images)}),
+                HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+            self.assertEqual(_resp.status_code, 200)
+            return _resp
+
+        with mock.patch("galleryfield.mixins.reverse",
+                        wraps=reverse) as mock_reverse:
+            fetch()
+
+            # One for validating crop_url_name, one for building the
+            # URL template
+            self.assertEqual(mock_reverse.call_count, 2)
+
+            # Cached
+            resp = fetch()
+            self.assertEqual(mock_reverse.call_count, 2)
+
+        resp_files = json.loads(resp.content)['files']
+        self.assertEqual(len(resp_files), 3)
+        for f in resp_files:
+            self.assertEqual(f["cropUrl"], self.get_demo_crop_url(f["pk"]))
+
+    def test_fetch_crop_url_language(self):
+        # e.g., the crop URL is in i18n_patterns
+        gallery = factories.DemoGalleryFactory.create(
+            creator=self.user, number_of_images=2)
+
+        self.c.force_login(self.user)
+        get_crop_url_parts.cache_clear()
+
+        def i18n_reverse(*args, **kwargs):
+            return f"/{get_language()}" + reverse(*args, **kwargs)
+
+        with mock.patch("galleryfield.mixins.reverse",
+                        side_effect=i18n_reverse):
+            for language in ["en", "fr", "en"]:
+                with self.subTest(language=language):
+                    with translation.override(language):
+                        resp = self.c.get(self.get_demo_fetch_url(
+                            params={"pks": list(gallery.images)}),
+                            HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+                    self.assertEqual(resp.status_code, 200)
+                    for f in json.loads(resp.content)['files']:
+                        self.assertEqual(
+                            f["cropUrl"],
+                            f"/{language}" + self.get_demo_crop_url(f["pk"]))
+
     def test_fetch_thumbnail_size_list(self):
         gallery = factories.DemoGalleryFactory.create(
             creator=self.user, number_of_images=5,
@@ -362,6 +740,32 @@ class GalleryWidgetFetchViewTest(ViewTestMixin, TestCase):
         )
         self.assertEqual(resp.status_code, 400)
 
+    def test_fetch_pks_invalid_format(self):
+        self.c.force_login(self.user)
+        for pks in ['[1, 2', '[1, -2]', '["1, 2]', '[1, 2]\n', '[1,, 2]',
+                    '[true]', '[\u0661]']:
+            with self.subTest(pks=pks):
+                resp = self.c.get(self.get_demo_fetch_url(
+                    params={"pks": pks}),
+                    HTTP_X_REQUESTED_WITH="XMLHttpRequest"
+                )
+                self.assertEqual(resp.status_code, 400)
+
+    def test_fetch_pks_valid_format(self):
+        gallery = factories.DemoGalleryFactory.create(
+            creator=self.user, number_of_images=2)
+        pk1, pk2 = gallery.images
+
+        self.c.force_login(self.user)
+        for pks in [f'[{pk1},{pk2}]', f'[ {pk1} , {pk2} ]',
+                    f'["{pk1}", "{pk2}"]', '[]']:
+            with self.subTest(pks=pks):
+                resp = self.c.get(self.get_demo_fetch_url(
+                    params={"pks": pks}),
+                    HTTP_X_REQUESTED_WITH="XMLHttpRequest"
+                )
+                self.assertEqual(resp.status_code, 200)
+
     def test_fetch_not_logged_in(self):
         gallery = factories.DemoGalleryFactory.create(
             creator=self.user, number_of_images=5,
@@ -569,6 +973,30 @@ class GalleryWidgetFetchViewTest(ViewTestMixin, TestCase):
             self.assertEqual(f['error'],
                              'thumbnail: RuntimeError: Unexpected error')
 
+    def test_cbv_get_thumbnail_error_in_workers(self):
+        gallery = factories.DemoGalleryFactory.create(
+            creator=self.user, number_of_images=3)
+
+        request = self.factory.get(
+            self.get_demo_fetch_url(
+                params={"pks": list(gallery.images)}),
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        request.user = self.user
+
+        with mock.patch("galleryfield.conf.THUMBNAIL_WORKERS", 2):
+            with mock.patch(
+                    "galleryfield.mixins.get_thumbnail") as mock_get_thumb:
+                mock_get_thumb.side_effect = RuntimeError("Unexpected error")
+                resp = built_in_views.BuiltInImageListView.as_view()(request)
+
+        self.assertEqual(resp.status_code, 200)
+
+        resp_files = json.loads(resp.content)['files']
+        self.assertEqual(len(resp_files), 3)
+        for f in resp_files:
+            self.assertEqual(f['error'],
+                             'thumbnail: RuntimeError: Unexpected error')
+
 
 @override_settings(MEDIA_ROOT=test_media_root)
 class GalleryWidgetCropViewTest(ViewTestMixin, TestCase):
@@ -637,6 +1065,35 @@ class GalleryWidgetCropViewTest(ViewTestMixin, TestCase):
                            HTTP_X_REQUESTED_WITH="XMLHttpRequest")
         self.assertEqual(resp.status_code, 400)
 
+    def test_get_and_validate_cropped_result(self):
+        view = built_in_views.BuiltInImageCropView()
+        for cropped_result, expected in [
+            ({"x": "10.6", "y": 20, "width": 30.2, "height": "40",
+              "rotate": -90},
+             (10, 20, 30, 40, -90, None, None)),
+            ({"x": 1, "y": 2, "width": 3, "height": 4, "rotate": 0,
+              "scaleX": "-1", "scaleY": 1},
+             (1, 2, 3, 4, 0, -1.0, 1.0)),
+        ]:
+            with self.subTest(cropped_result=cropped_result):
+                view.request = self.factory.post(
+                    "/", data={"cropped_result": json.dumps(cropped_result)})
+                self.assertEqual(
+                    view.get_and_validate_cropped_result_from_request(),
+                    expected)
+
+        for cropped_result in [
+                {"x": 1, "y": 2, "width": 3, "height": 4},
+                {"x": 1, "y": 2, "width": 3, "height": 4, "rotate": "a"},
+                {"x": 1, "y": 2, "width": 3, "height": 4, "rotate": 0,
+                 "scaleX": None},
+                [1, 2, 3, 4, 0]]:
+            with self.subTest(cropped_result=cropped_result):
+                view.request = self.factory.post(
+                    "/", data={"cropped_result": json.dumps(cropped_result)})
+                with self.assertRaises(SuspiciousOperation):
+                    view.get_and_validate_cropped_result_from_request()
+
     def test_crop_no_cropResult(self):
         data = self.get_default_crop_post_data(x=None)
 
@@ -669,6 +1126,156 @@ class GalleryWidgetCropViewTest(ViewTestMixin, TestCase):
                            HTTP_X_REQUESTED_WITH="XMLHttpRequest")
         self.assertEqual(resp.status_code, 200, resp.content)
 
+    def test_crop_by_vips(self):
+        pk = self.get_demo_crop_pk(0)
+        data = self.get_default_crop_post_data()
+
+        cropped_io = BytesIO()
+        Image.new("RGB", (400, 810)).save(cropped_io, format="JPEG")
+
+        self.c.force_login(self.user)
+        with mock.patch(
+                "galleryfield.mixins.crop_image_with_vips") as mock_crop:
+            mock_crop.return_value = (cropped_io.getvalue(), "image/jpeg")
+            resp = self.c.post(
+                self.get_demo_crop_url(pk), data=data,
+                HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+            self.assertEqual(resp.status_code, 200, resp.content)
+            self.assertEqual(mock_crop.call_count, 1)
+
+        new_image = BuiltInGalleryImage.objects.last()
+        self.assertEqual(Image.open(new_image.image.path).size, (400, 810))
+
+    def test_crop_spooled_to_disk(self):
+        pk = self.get_demo_crop_pk(0)
+        data = self.get_default_crop_post_data()
+
+        self.c.force_login(self.user)
+        with override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=1):
+            resp = self.c.post(
+                self.get_demo_crop_url(pk), data=data,
+                HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        self.assertEqual(resp.status_code, 200, resp.content)
+
+        new_image = BuiltInGalleryImage.objects.last()
+        self.assertNotEqual(new_image.pk, pk)
+        self.assertEqual(Image.open(new_image.image.path).size, (400, 810))
+
+    def test_crop_small_result_kept_in_memory(self):
+        pk = self.get_demo_crop_pk(0)
+        data = self.get_default_crop_post_data()
+
+        spooled_files = []
+
+        def spooled_temporary_file(*args, **kwargs):
+            spooled_files.append(SpooledTemporaryFile(*args, **kwargs))
+            return spooled_files[-1]
+
+        self.c.force_login(self.user)
+        with mock.patch("galleryfield.mixins.SpooledTemporaryFile",
+                        side_effect=spooled_temporary_file):
+            resp = self.c.post(
+                self.get_demo_crop_url(pk), data=data,
+                HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        self.assertEqual(resp.status_code, 200, resp.content)
+
+        self.assertEqual(len(spooled_files), 1)
+        self.assertFalse(spooled_files[0]._rolled)
+
+        new_image = BuiltInGalleryImage.objects.last()
+        self.assertEqual(Image.open(new_image.image.path).format, "JPEG")
+        self.assertEqual(Image.open(new_image.image.path).size, (400, 810))
+
+    def _use_crop_worker_process(self):
+        patcher = mock.patch("galleryfield.conf.SERVER_SIDE_CROP_WORKERS", 1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        def shutdown_executor():
+            galleryfield_mixins.get_crop_executor().shutdown()
+            galleryfield_mixins._crop_executor = None
+
+        self.addCleanup(shutdown_executor)
+
+    def test_crop_in_worker_process(self):
+        self._use_crop_worker_process()
+        pk = self.get_demo_crop_pk(0)
+        data = self.get_default_crop_post_data()
+
+        self.c.force_login(self.user)
+        resp = self.c.post(
+            self.get_demo_crop_url(pk), data=data,
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        self.assertEqual(resp.status_code, 200, resp.content)
+
+        new_image = BuiltInGalleryImage.objects.last()
+        self.assertNotEqual(new_image.pk, pk)
+        self.assertEqual(Image.open(new_image.image.path).size, (400, 810))
+
+    def test_crop_worker_processes_spawned(self):
+        self._use_crop_worker_process()
+        self.assertEqual(
+            galleryfield_mixins.get_crop_executor()._mp_context
+            .get_start_method(), "spawn")
+
+    def _post_default_crop(self):
+        pk = self.get_demo_crop_pk(0)
+        self.c.force_login(self.user)
+        return self.c.post(
+            self.get_demo_crop_url(pk), data=self.get_default_crop_post_data(),
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+
+    def test_crop_in_worker_process_pool_broken(self):
+        self._use_crop_worker_process()
+
+        # A worker is killed, e.g., for running out of memory
+        executor = galleryfield_mixins.get_crop_executor()
+        os.kill(executor.submit(os.getpid).result(), signal.SIGKILL)
+        with self.assertRaises(BrokenProcessPool):
+            executor.submit(os.getpid).result()
+
+        resp = self._post_default_crop()
+        self.assertEqual(resp.status_code, 200, resp.content)
+        self.assertIsNot(galleryfield_mixins.get_crop_executor(), executor)
+
+        new_image = BuiltInGalleryImage.objects.last()
+        self.assertEqual(Image.open(new_image.image.path).size, (400, 810))
+
+    def test_crop_in_worker_process_pool_broken_retried_once(self):
+        self._use_crop_worker_process()
+
+        with mock.patch.object(
+                ProcessPoolExecutor, "submit",
+                side_effect=BrokenProcessPool) as mock_submit:
+            resp = self._post_default_crop()
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(mock_submit.call_count, 2)
+
+    def test_crop_in_worker_process_timeout(self):
+        self._use_crop_worker_process()
+        executor = galleryfield_mixins.get_crop_executor()
+
+        with mock.patch("galleryfield.conf.SERVER_SIDE_CROP_TIMEOUT", 0.01):
+            with mock.patch.object(
+                    ProcessPoolExecutor, "submit", return_value=Future()):
+                resp = self._post_default_crop()
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertIsNot(galleryfield_mixins.get_crop_executor(), executor)
+
+    def test_crop_in_worker_process_io_error(self):
+        self._use_crop_worker_process()
+        gallery = factories.DemoGalleryFactory.create(creator=self.user)
+        os.remove(gallery.images.objects.first().image.path)
+
+        pk = gallery.images.objects.first().pk
+        data = self.get_crop_post_data()
+        self.c.force_login(self.user)
+        resp = self.c.post(self.get_demo_crop_url(pk), data=data,
+                           HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        self.assertEqual(resp.status_code, 400)
+
     def test_crop_io_error(self):
         # no actual image file
         gallery = factories.DemoGalleryFactory.create(creator=self.user)